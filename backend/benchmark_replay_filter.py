@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the offline proof replay filter used by /sync.
+
+Pushes unique proof ids through claim_offline_proofs() in /sync sized batches
+and reports throughput, the measured false positive rate and the memory the
+filter uses, then replays a sample of recent proofs to check they are caught.
+
+It reads and deletes the sync:* replay keys, so point it at a scratch database:
+
+    python backend/benchmark_replay_filter.py --redis-url redis://localhost:6379/15
+    python backend/benchmark_replay_filter.py --proofs 10000000 --capacity 5000000
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import secrets
+import sys
+import time
+
+from redis.exceptions import ResponseError
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the /sync replay filter")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--proofs", type=int, default=10_000_000, help="unique proofs to record")
+    parser.add_argument("--capacity", type=int, help="proofs per filter slot (SYNC_FILTER_CAPACITY)")
+    parser.add_argument("--error-rate", type=float, help="target error rate per slot (SYNC_FILTER_ERROR_RATE)")
+    parser.add_argument("--batch", type=int, default=1000, help="proofs per claim, like SYNC_CHUNK_SIZE")
+    parser.add_argument("--concurrency", type=int, default=4, help="claims in flight at once")
+    parser.add_argument("--replays", type=int, default=10_000, help="recent proofs to submit again")
+    return parser.parse_args()
+
+
+async def run_benchmark(main, client, total, batch, concurrency, replays):
+    """Runs the benchmark against `client` and prints the results."""
+    await client.delete(main.SYNC_FILTER_KEY, main.SYNC_FILTER_META_KEY, main.SYNC_RECENT_KEY)
+
+    print(f"Filter: {main.SYNC_FILTER_SLOTS} slots x {main.SYNC_FILTER_SLOT_BYTES / 1024 / 1024:.2f} MiB, "
+          f"{main.SYNC_FILTER_HASHES} hashes, {main.SYNC_FILTER_CAPACITY:,} proofs per slot")
+    print(f"Recording {total:,} unique proofs in batches of {batch:,} ({concurrency} in flight)...")
+
+    next_proof = 0
+    false_positives = 0
+    recent_ids = []
+
+    async def worker():
+        nonlocal next_proof, false_positives
+        while next_proof < total:
+            size = min(batch, total - next_proof)
+            first = next_proof
+            next_proof += size
+            proof_ids = [main.offline_proof_id("bench", nonce) for nonce in range(first, first + size)]
+            fresh = await main.claim_offline_proofs(proof_ids, client=client)
+            false_positives += fresh.count(False)
+            if total - first <= replays + batch:
+                recent_ids.extend(proof_ids)
+
+    start = time.perf_counter()
+    last_report = start
+    tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    while not all(task.done() for task in tasks):
+        await asyncio.sleep(0.5)
+        now = time.perf_counter()
+        if now - last_report >= 10:
+            last_report = now
+            print(f"  {next_proof:,} proofs, {next_proof / (now - start):,.0f}/s")
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    # Slots are only ever compared with the one before them, so the expected
+    # rate is roughly that of two full slots checked independently
+    slot_rate = (1 - math.exp(-main.SYNC_FILTER_HASHES * main.SYNC_FILTER_CAPACITY / main.SYNC_FILTER_SLOT_BITS)) ** main.SYNC_FILTER_HASHES
+    print(f"Throughput: {total / elapsed:,.0f} proofs/s ({elapsed:.1f}s)")
+    print(f"False positives: {false_positives:,} of {total:,} ({false_positives / total:.5%}), "
+          f"expected at most ~{1 - (1 - slot_rate) ** 2:.5%}")
+
+    replay_ids = recent_ids[-replays:]
+    caught = 0
+    for i in range(0, len(replay_ids), batch):
+        fresh = await main.claim_offline_proofs(replay_ids[i:i + batch], client=client)
+        caught += fresh.count(False)
+    if replay_ids:
+        print(f"Replays caught: {caught:,} of {len(replay_ids):,}")
+
+    try:
+        memory = 0
+        for key in (main.SYNC_FILTER_KEY, main.SYNC_FILTER_META_KEY, main.SYNC_RECENT_KEY):
+            memory += await client.memory_usage(key) or 0
+        print(f"Redis memory: {memory / 1024 / 1024:.2f} MiB")
+    except ResponseError:
+        print("Redis memory: MEMORY USAGE is not supported by this server")
+
+    await client.delete(main.SYNC_FILTER_KEY, main.SYNC_FILTER_META_KEY, main.SYNC_RECENT_KEY)
+
+
+async def main_async(args):
+    # The filter is sized from the environment when the backend module loads
+    if args.capacity:
+        os.environ["SYNC_FILTER_CAPACITY"] = str(args.capacity)
+    if args.error_rate:
+        os.environ["SYNC_FILTER_ERROR_RATE"] = str(args.error_rate)
+    # Nothing is signed here, but the backend will not load without a key
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    import redis.asyncio as redis
+
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    try:
+        await run_benchmark(main, client, args.proofs, args.batch, args.concurrency, args.replays)
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
@@ -1,27 +1,65 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import redis
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, computed_field
+import redis.asyncio as redis
 import json
 import hashlib
+import math
+import hmac
 import secrets
 import time
 import os
 from typing import List, Optional
 import bcrypt
+from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
 import pytz
 import random
+import asyncio
+import multiprocessing
+import contextvars
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Explicitly find and load the .env file from the project root
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 
-app = FastAPI(title="CryptoSim API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens shared resources on startup and releases them on shutdown."""
+    if not await redis_client.exists(USER_MIGRATION_KEY):
+        await migrate_user_records()
+        await redis_client.set(USER_MIGRATION_KEY, datetime.now(timezone.utc).isoformat())
+    if not await redis_client.exists(STATS_SEED_KEY):
+        await reconcile_stats()
+        await redis_client.set(STATS_SEED_KEY, datetime.now(timezone.utc).isoformat())
+
+    background_tasks = [
+        asyncio.create_task(run_group_job_scheduler()),
+        asyncio.create_task(run_token_denylist_refresh()),
+        asyncio.create_task(run_activity_writer()),
+        asyncio.create_task(run_leaderboard_feed()),
+        asyncio.create_task(run_group_job_event_listener()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await flush_activity()
+    password_hash_executor.shutdown(wait=False, cancel_futures=True)
+    if sync_verify_executor is not None:
+        sync_verify_executor.shutdown(wait=False, cancel_futures=True)
+    await redis_client.aclose()
+    await redis_pool.disconnect()
+
+app = FastAPI(title="CryptoSim API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for web frontend
 app.add_middleware(
@@ -32,26 +70,714 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics. Every HTTP request records its latency, status, and the number of
+# Redis commands, round trips and seconds it spent on Redis; /metrics serves them
+# in the Prometheus text format. Each worker process keeps its own numbers.
+class Counter:
+    """A Prometheus counter with labels"""
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}  # label tuple -> value
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(labels)} {value}")
+        return lines
+
+class Histogram:
+    """A Prometheus histogram with labels"""
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}  # label tuple -> [count per bucket, sum, count]
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (bucket_counts, total, count) in self.series.items():
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', str(bound)),))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REDIS_COMMAND_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS)
+http_requests_total = Counter("http_requests_total", "HTTP requests by route and status.")
+redis_commands_per_request = Histogram("redis_commands_per_request", "Redis commands issued by one HTTP request.", REDIS_COMMAND_BUCKETS)
+redis_commands_total = Counter("redis_commands_total", "Redis commands by route (background tasks use route=\"background\").")
+redis_round_trips_total = Counter("redis_round_trips_total", "Redis round trips by route; a pipeline is one round trip.")
+redis_seconds_total = Counter("redis_seconds_total", "Seconds spent waiting on Redis by route.")
+http_requests_in_flight = 0
+
+# Redis usage of the request being handled: {"commands", "round_trips", "seconds"}
+current_redis_usage = contextvars.ContextVar("current_redis_usage", default=None)
+
+def record_redis_call(commands: int, seconds: float):
+    """Charges one round trip to the current request, or to background work outside requests."""
+    usage = current_redis_usage.get()
+    if usage is None:
+        redis_commands_total.inc((("route", "background"),), commands)
+        redis_round_trips_total.inc((("route", "background"),))
+        redis_seconds_total.inc((("route", "background"),), seconds)
+        return
+    usage["commands"] += commands
+    usage["round_trips"] += 1
+    usage["seconds"] += seconds
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """Pipeline that reports each execute() as one round trip"""
+    async def execute(self, raise_on_error: bool = True):
+        commands = len(self.command_stack)
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            if commands:
+                record_redis_call(commands, time.perf_counter() - start)
+
+    async def immediate_execute_command(self, *args, **options):
+        # WATCH and the commands between WATCH and MULTI run straight away
+        start = time.perf_counter()
+        try:
+            return await super().immediate_execute_command(*args, **options)
+        finally:
+            record_redis_call(1, time.perf_counter() - start)
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that reports every command and pipeline to the metrics"""
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record_redis_call(1, time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class MetricsMiddleware:
+    """ASGI middleware that records latency, status and Redis usage for every HTTP request"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global http_requests_in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = {"commands": 0, "round_trips": 0, "seconds": 0.0}
+        usage_token = current_redis_usage.set(usage)
+        response_status = 500
+
+        async def send_and_record_status(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
+
+        http_requests_in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_record_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight -= 1
+            current_redis_usage.reset(usage_token)
+
+            # Label by route template so /groupjob/{job_id} is one series, not one per job
+            route = scope.get("route")
+            labels = (("method", scope["method"]), ("route", route.path if route else "unmatched"))
+            http_request_duration.observe(labels, elapsed)
+            http_requests_total.inc(labels + (("status", str(response_status)),))
+            redis_commands_per_request.observe(labels, usage["commands"])
+            redis_commands_total.inc(labels[1:], usage["commands"])
+            redis_round_trips_total.inc(labels[1:], usage["round_trips"])
+            redis_seconds_total.inc(labels[1:], usage["seconds"])
+
+app.add_middleware(MetricsMiddleware)
+
 # Redis connection
 redis_host = os.getenv("UPSTASH_REDIS_REST_URL", "localhost")
 redis_port = int(os.getenv("UPSTASH_REDIS_REST_PORT", 6379))
 redis_password = os.getenv("UPSTASH_REDIS_REST_PASSWORD", "")
 
+# Connection pool settings. Handlers share one pool so a single worker can keep
+# many requests in flight; once the pool is exhausted callers wait up to
+# REDIS_POOL_TIMEOUT seconds for a free connection instead of failing.
+redis_max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+redis_pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+redis_socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+
 redis_config = {
     "host": redis_host,
     "port": redis_port,
     "password": redis_password,
     "decode_responses": True,
+    "max_connections": redis_max_connections,
+    "timeout": redis_pool_timeout,
+    "socket_timeout": redis_socket_timeout,
+    "socket_connect_timeout": redis_socket_timeout,
+    "health_check_interval": 30,
 }
 
 if "upstash.io" in redis_host:
-    redis_config["ssl"] = True
+    redis_config["connection_class"] = redis.SSLConnection
 
-redis_client = redis.Redis(**redis_config)
+redis_pool = redis.BlockingConnectionPool(**redis_config)
+redis_client = InstrumentedRedis(connection_pool=redis_pool)
 
 # Security
 security = HTTPBearer()
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+
+# SECRET_KEY signs access tokens and mining challenges, so anyone who knows it
+# can log in as any user or mint their own easy challenges. Refuse to start
+# without one rather than fall back to a value printed in the docs.
+PLACEHOLDER_SECRET_KEYS = {"your-secret-key-here", "your-random-secret-key"}
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+if not SECRET_KEY or SECRET_KEY in PLACEHOLDER_SECRET_KEYS:
+    raise RuntimeError(
+        "SECRET_KEY is not set or is still the example value; generate one with "
+        "python -c \"import secrets; print(secrets.token_hex(32))\""
+    )
+
+# Access tokens are HS256 JWTs checked in-process, so authenticated requests do
+# not touch Redis. Each token carries a session id (jti); user_token:{username}
+# holds the user's current one. Revoked ids go into REVOKED_TOKENS_KEY (scored by
+# expiry) and every worker copies that set into revoked_tokens every
+# TOKEN_DENYLIST_REFRESH seconds, so a logout or a newer login takes effect
+# everywhere within that interval.
+# Access tokens are short-lived; clients trade their refresh token
+# ("{session id}.{secret}", rotated on every use and stored as a SHA-256 hash in
+# refresh:{session id}) at /refresh for a new pair instead of logging in again.
+TOKEN_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", 15 * 60))  # seconds
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", 30 * 24 * 60 * 60))  # seconds, renewed on use
+REVOKED_TOKENS_KEY = "auth:revoked_tokens"
+TOKEN_DENYLIST_REFRESH = float(os.getenv("TOKEN_DENYLIST_REFRESH", 5))  # seconds
+revoked_tokens = {}  # jti -> expiry timestamp
+
+# Password hashing. bcrypt runs on its own small thread pool so logins never block
+# the event loop; at most PASSWORD_HASH_QUEUE hashes may be running or waiting,
+# beyond that /register and /login answer 503 with Retry-After. Stored hashes
+# with a different cost factor are rehashed on the next successful login.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 32))
+PASSWORD_HASH_RETRY_AFTER = 2  # seconds
+password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+password_hash_slots = asyncio.Semaphore(PASSWORD_HASH_QUEUE)
+
+# Leaderboard indexes: "leaderboard" ranks users by balance, TOTAL_MINED_KEY holds
+# each user's total_mined so the leaderboard never has to load user records
+TOTAL_MINED_KEY = "leaderboard:total_mined"
+# Bumped by every script that changes a balance or adds a user, so the live
+# feed can tell whether the board moved with a single GET
+LEADERBOARD_VERSION_KEY = "leaderboard:version"
+
+# Running totals for /stats, updated in the same MULTI/EXEC as every balance change.
+# Rebuild them with `python backend/main.py reconcile-stats`.
+SUPPLY_KEY = "stats:total_supply"
+USER_COUNT_KEY = "stats:total_users"
+
+# Marks that the counters have been seeded from the leaderboard. Seeding happens
+# at startup, before any INCR/INCRBYFLOAT could create the counters from zero.
+STATS_SEED_KEY = "migrations:stats_counters"
+
+# User records are Redis hashes; this marker records that old JSON-string
+# records have been converted (see migrate_user_records). An instance from before
+# the migration can still write JSON records during a rolling deploy, so every
+# reader and script also converts a record it finds as a string.
+USER_MIGRATION_KEY = "migrations:user_hashes"
+
+# Group job lifecycle. One worker at a time holds the scheduler lock and keeps
+# ACTIVE_GROUP_JOBS jobs available; job keys expire on their own after GROUP_JOB_TTL.
+ACTIVE_GROUP_JOBS = 3
+GROUP_JOB_TTL = 24 * 60 * 60  # seconds
+GROUP_JOB_SCHEDULER_INTERVAL = int(os.getenv("GROUP_JOB_SCHEDULER_INTERVAL", 15))  # seconds
+GROUP_JOB_SCHEDULER_LOCK = "group_jobs:scheduler_lock"
+# Each solve bumps a job's version and is recorded in job:{id}:changes so miners
+# can fetch only what changed; older entries beyond this many are dropped
+GROUP_JOB_CHANGE_LOG_LENGTH = 256
+MAX_BATCH_PROOFS = 256  # proofs accepted by one /groupjobs/submit/batch request
+# Miners lease a challenge before working on it so they spread out instead of
+# grinding the same one; a lease lapses after this long unless it is renewed
+GROUP_JOB_LEASE_TTL = int(os.getenv("GROUP_JOB_LEASE_TTL", 120))  # seconds
+
+# Offline proof sync. Uploads are verified in chunks of SYNC_CHUNK_SIZE proofs on a
+# process pool of SYNC_VERIFY_WORKERS, with at most two chunks per worker in flight
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", 1000))
+SYNC_VERIFY_WORKERS = int(os.getenv("SYNC_VERIFY_WORKERS", 2))
+SYNC_MAX_LINE_BYTES = 4096  # longest NDJSON line accepted from /sync
+sync_verify_executor = None
+
+# Replay protection for offline proofs. Offline challenges are made up by the
+# client, so every paid (challenge, nonce) is recorded in a rotating Bloom filter
+# held in one Redis bitmap: SYNC_FILTER_SLOTS slots, each sized for
+# SYNC_FILTER_CAPACITY proofs at SYNC_FILTER_ERROR_RATE. When the current slot
+# is full the oldest one is cleared and reused, so memory stays fixed and the
+# last SYNC_FILTER_CAPACITY * (SYNC_FILTER_SLOTS - 1) proofs are always covered.
+# The most recent SYNC_RECENT_WINDOW proof ids are also kept exactly, to count
+# filter hits that are not confirmed replays. That count is diagnostic only: a
+# hit outside the window may be a false positive or an older replay, so it is
+# logged but never paid.
+SYNC_FILTER_KEY = "sync:replay_filter"
+SYNC_FILTER_META_KEY = "sync:replay_filter:meta"
+SYNC_RECENT_KEY = "sync:recent_proofs"
+SYNC_FILTER_CAPACITY = int(os.getenv("SYNC_FILTER_CAPACITY", 1_000_000))  # proofs per slot
+SYNC_FILTER_ERROR_RATE = float(os.getenv("SYNC_FILTER_ERROR_RATE", 0.001))
+SYNC_FILTER_SLOTS = 2
+SYNC_RECENT_WINDOW = int(os.getenv("SYNC_RECENT_WINDOW", 20_000))
+# Standard Bloom sizing: m = -n ln(p) / ln(2)^2 bits, k = m / n * ln(2) hashes.
+# Slots are whole bytes so the rotation can clear one with a single SETRANGE.
+SYNC_FILTER_SLOT_BYTES = math.ceil(-SYNC_FILTER_CAPACITY * math.log(SYNC_FILTER_ERROR_RATE) / math.log(2) ** 2 / 8)
+SYNC_FILTER_SLOT_BITS = SYNC_FILTER_SLOT_BYTES * 8
+SYNC_FILTER_HASHES = max(1, round(SYNC_FILTER_SLOT_BITS / SYNC_FILTER_CAPACITY * math.log(2)))
+
+# Activity log. Entries are buffered in-process and written by a background task
+# in pipelined batches every ACTIVITY_FLUSH_INTERVAL seconds, or sooner once
+# ACTIVITY_FLUSH_SIZE are waiting; whatever is left is written on shutdown.
+# The group submit script writes its entries directly, so a buffered entry can
+# land after newer ones. /activity sorts by timestamp when reading; the trim
+# keeps the ACTIVITY_LOG_LENGTH entries written last.
+ACTIVITY_LOG_LENGTH = 10  # entries kept per user
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", 0.5))  # seconds
+ACTIVITY_FLUSH_SIZE = 500
+ACTIVITY_BUFFER_LIMIT = 50_000  # entries kept while Redis is unreachable
+activity_buffer = []  # (username, entry JSON) in the order they happened
+activity_flush_needed = asyncio.Event()
+EST_TZ = pytz.timezone('US/Eastern')
+
+# Live leaderboard feed. One producer per worker checks LEADERBOARD_VERSION_KEY
+# every LEADERBOARD_FEED_INTERVAL seconds while anyone is subscribed, rereads the
+# top of the board only when the version has moved and pushes it to every
+# /ws/leaderboard socket if it looks different; each socket holds at most one
+# pending update, so a slow client just gets the newest board.
+LEADERBOARD_FEED_INTERVAL = float(os.getenv("LEADERBOARD_FEED_INTERVAL", 2))  # seconds
+leaderboard_subscribers = set()  # one asyncio.Queue per connected socket
+leaderboard_snapshot = None  # last board sent, as JSON
+leaderboard_version = None  # LEADERBOARD_VERSION_KEY when the snapshot was read
+
+# Group job events. The submit script publishes every solve and completion on
+# job:{id}:events; each worker keeps one pattern subscription and hands the
+# events to the /ws/groupjob sockets it is serving for that job.
+GROUP_JOB_EVENTS_PATTERN = "job:*:events"
+group_job_subscribers = {}  # job id -> set of asyncio.Queue, one per socket
+
+# Online mining settings
+MINE_DIFFICULTY = 5
+MINE_TIME_LIMIT = 5  # seconds; the time bonus runs out after this
+MINE_CHALLENGE_TTL = int(os.getenv("MINE_CHALLENGE_TTL", 60))  # seconds a challenge stays valid
+# The legacy POST /mine searches on the server, on the /sync process pool so the
+# hashing never holds the event loop's GIL; cap how many run at once per worker
+legacy_mine_slots = asyncio.Semaphore(int(os.getenv("LEGACY_MINE_CONCURRENCY", 1)))
+
+# Server-side scripts. Every balance change runs as one script so it costs a
+# single round trip and concurrent updates cannot overwrite each other.
+
+# Prefix for scripts that touch user records: convert_user(key) turns a record
+# still stored as a JSON string into a hash, like migrate_user_records does
+CONVERT_USER_RECORD_LUA = """
+local function convert_user(key)
+    if redis.call('TYPE', key).ok ~= 'string' then
+        return
+    end
+    local user = cjson.decode(redis.call('GET', key))
+    redis.call('DEL', key)
+    for field, value in pairs(user) do
+        if type(value) == 'number' then
+            value = string.format('%.17g', value)
+        end
+        if type(value) == 'string' then
+            redis.call('HSET', key, field, value)
+        end
+    end
+end
+"""
+
+# KEYS: user hash, balance leaderboard, total_mined index, supply counter,
+#       leaderboard version
+# ARGV: username, balance delta, total_mined delta
+# Returns the new balance, or nil if the user does not exist.
+CREDIT_USER_LUA = CONVERT_USER_RECORD_LUA + """
+convert_user(KEYS[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local balance = redis.call('HINCRBYFLOAT', KEYS[1], 'balance', ARGV[2])
+redis.call('ZADD', KEYS[2], balance, ARGV[1])
+if tonumber(ARGV[3]) ~= 0 then
+    local total_mined = redis.call('HINCRBYFLOAT', KEYS[1], 'total_mined', ARGV[3])
+    redis.call('ZADD', KEYS[3], total_mined, ARGV[1])
+end
+redis.call('INCRBYFLOAT', KEYS[4], ARGV[2])
+redis.call('INCR', KEYS[5])
+return balance
+"""
+
+# KEYS: user hash, wallet key, balance leaderboard, total_mined index, user counter,
+#       leaderboard version
+# ARGV: username, password hash, wallet address, created_at
+# Returns 1 if the user was created, or 0 if the username is already taken.
+REGISTER_USER_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'username', ARGV[1], 'password_hash', ARGV[2], 'wallet_address', ARGV[3],
+    'balance', 0.0, 'total_mined', 0.0, 'created_at', ARGV[4])
+redis.call('SET', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], 0.0, ARGV[1])
+redis.call('ZADD', KEYS[4], 0.0, ARGV[1])
+redis.call('INCR', KEYS[5])
+redis.call('INCR', KEYS[6])
+return 1
+"""
+
+# KEYS: sender hash, recipient hash, balance leaderboard, leaderboard version
+# ARGV: sender username, recipient username, amount
+# Returns {1, sender balance, recipient balance}, {0} on insufficient funds
+# or {-1} if either user does not exist.
+TRANSFER_LUA = CONVERT_USER_RECORD_LUA + """
+convert_user(KEYS[1])
+convert_user(KEYS[2])
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('EXISTS', KEYS[2]) == 0 then
+    return {-1}
+end
+if tonumber(redis.call('HGET', KEYS[1], 'balance')) < tonumber(ARGV[3]) then
+    return {0}
+end
+local sender_balance = redis.call('HINCRBYFLOAT', KEYS[1], 'balance', '-' .. ARGV[3])
+local recipient_balance = redis.call('HINCRBYFLOAT', KEYS[2], 'balance', ARGV[3])
+redis.call('ZADD', KEYS[3], sender_balance, ARGV[1], recipient_balance, ARGV[2])
+redis.call('INCR', KEYS[4])
+return {1, sender_balance, recipient_balance}
+"""
+
+# Claims a batch of offline proofs in the replay filter. Reserves room for the
+# batch, moving on to the next slot (and clearing it) once the current one has
+# taken its capacity, then probes every proof against the slots of that same
+# generation, so a concurrent rotation cannot clear a slot between the two.
+# Each proof is one BITFIELD that reads its bits in the previous slot, sets them
+# in the current one and hands back the old bits, so two uploads racing with the
+# same proof cannot both win. Fresh ids go into the exact recent window.
+# KEYS: filter meta hash, filter bitmap, recent proof ids
+# ARGV: capacity per slot, bytes per slot, slot count, hashes per proof,
+#       recent window size, timestamp, then each proof's id followed by its bit offsets
+# Returns {hits missing from the recent window, {1 if fresh else 0, per proof}}.
+CLAIM_OFFLINE_PROOFS_LUA = """
+local hashes = tonumber(ARGV[4])
+local proofs = (#ARGV - 6) / (hashes + 1)
+local slots = tonumber(ARGV[3])
+local slot_bytes = tonumber(ARGV[2])
+
+local generation = tonumber(redis.call('HGET', KEYS[1], 'generation') or 0)
+local count = redis.call('HINCRBY', KEYS[1], 'count', proofs)
+if count > tonumber(ARGV[1]) and count > proofs then
+    generation = generation + 1
+    redis.call('HSET', KEYS[1], 'generation', generation, 'count', proofs)
+    redis.call('SETRANGE', KEYS[2], (generation % slots) * slot_bytes, string.rep(string.char(0), slot_bytes))
+end
+local current_start = (generation % slots) * slot_bytes * 8
+local previous_start = ((generation - 1) % slots) * slot_bytes * 8
+
+local fresh = {}
+local hits = {}
+for i = 7, #ARGV, hashes + 1 do
+    local probe = {}
+    for j = 1, hashes do
+        probe[#probe + 1] = 'GET'
+        probe[#probe + 1] = 'u1'
+        probe[#probe + 1] = previous_start + tonumber(ARGV[i + j])
+    end
+    for j = 1, hashes do
+        probe[#probe + 1] = 'SET'
+        probe[#probe + 1] = 'u1'
+        probe[#probe + 1] = current_start + tonumber(ARGV[i + j])
+        probe[#probe + 1] = 1
+    end
+    local bits = redis.call('BITFIELD', KEYS[2], unpack(probe))
+    local in_previous, in_current = true, true
+    for j = 1, hashes do
+        in_previous = in_previous and bits[j] == 1
+        in_current = in_current and bits[hashes + j] == 1
+    end
+    if in_previous or in_current then
+        fresh[#fresh + 1] = 0
+        hits[#hits + 1] = ARGV[i]
+    else
+        fresh[#fresh + 1] = 1
+        redis.call('ZADD', KEYS[3], ARGV[6], ARGV[i])
+    end
+end
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -(tonumber(ARGV[5]) + 1))
+
+local unconfirmed = 0
+for _, proof_id in ipairs(hits) do
+    if not redis.call('ZSCORE', KEYS[3], proof_id) then
+        unconfirmed = unconfirmed + 1
+    end
+end
+return {unconfirmed, fresh}
+"""
+
+# Rotates a refresh token: checks the presented secret and stores the next one.
+# Only SHA-256 hashes are compared, so the comparison reveals nothing about the secret.
+# KEYS: refresh:{session id}
+# ARGV: session id, hash of the presented secret, hash of the new secret, refresh TTL
+# Returns {1, username, wallet address}; {0} if the session has ended or been
+# replaced by a newer login; {-1} if an already-used token was presented, in
+# which case the session is ended.
+ROTATE_REFRESH_TOKEN_LUA = """
+local session = redis.call('HMGET', KEYS[1], 'token_hash', 'username', 'wallet_address')
+if not session[1] then
+    return {0}
+end
+local session_key = 'user_token:' .. session[2]
+if redis.call('GET', session_key) ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {0}
+end
+if session[1] ~= ARGV[2] then
+    redis.call('DEL', KEYS[1], session_key)
+    return {-1}
+end
+redis.call('HSET', KEYS[1], 'token_hash', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', session_key, ARGV[4])
+return {1, session[2], session[3]}
+"""
+
+# Leases a group job challenge to a miner, preferring the challenges held by the
+# fewest other miners. Expired leases are reclaimed first, and the miner's
+# previous lease is given up unless it asks to renew it and it is still unsolved.
+# The lease keys expire together with the job.
+# KEYS: job hash, unsolved challenges set, leases hash (username -> challenge),
+#       lease expiry zset (username -> expiry), lease holders zset (challenge -> count)
+# ARGV: username, current time, lease seconds, renew (1 or 0)
+# Returns {challenge, expires at, other holders}, or {} if the job is not active.
+LEASE_GROUP_CHALLENGE_LUA = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'active' then
+    return {}
+end
+local now = tonumber(ARGV[2])
+local expires_at = now + tonumber(ARGV[3])
+
+local function release(name)
+    local challenge = redis.call('HGET', KEYS[3], name)
+    if challenge then
+        redis.call('HDEL', KEYS[3], name)
+        if tonumber(redis.call('ZINCRBY', KEYS[5], -1, challenge)) <= 0 then
+            redis.call('ZREM', KEYS[5], challenge)
+        end
+    end
+    redis.call('ZREM', KEYS[4], name)
+end
+
+for _, name in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now)) do
+    release(name)
+end
+
+local current = redis.call('HGET', KEYS[3], ARGV[1])
+if current and ARGV[4] == '1' and redis.call('SISMEMBER', KEYS[2], current) == 1 then
+    redis.call('ZADD', KEYS[4], expires_at, ARGV[1])
+    return {current, tostring(expires_at), tonumber(redis.call('ZSCORE', KEYS[5], current)) - 1}
+end
+release(ARGV[1])
+
+local best, best_count = nil, nil
+for _, challenge in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    local count = tonumber(redis.call('ZSCORE', KEYS[5], challenge) or 0)
+    if best == nil or count < best_count then
+        best, best_count = challenge, count
+        if count == 0 then
+            break
+        end
+    end
+end
+if best == nil then
+    return {}
+end
+
+redis.call('HSET', KEYS[3], ARGV[1], best)
+redis.call('ZADD', KEYS[4], expires_at, ARGV[1])
+redis.call('ZINCRBY', KEYS[5], 1, best)
+local job_ttl = redis.call('TTL', KEYS[1])
+if job_ttl > 0 then
+    for i = 3, 5 do
+        redis.call('EXPIRE', KEYS[i], job_ttl)
+    end
+end
+return {best, tostring(expires_at), best_count}
+"""
+
+# Group job completion bonus: base * (total_hashes / 16) * difficulty multiplier,
+# split between contributors by the number of hashes each one solved
+GROUP_JOB_BONUS_SETTINGS = json.dumps({
+    "base_bonus": 0.01,
+    "size_unit": 16,
+    "difficulty_multipliers": {"5": 1.0, "6": 1.15, "7": 1.3}
+})
+
+# Claims a group job challenge and applies every resulting write in one step:
+# reward (or 10% consolation for a duplicate), contributor tally, progress
+# counter, completion flag, contributor bonuses and activity log entries.
+# Contributors' user:* and activity:* keys are derived from their usernames.
+# Each solve, and the completion, is published on job:{id}:events for
+# /ws/groupjob subscribers.
+# KEYS: job hash, unsolved challenges set, contributors hash, active jobs set,
+#       balance leaderboard, total_mined index, supply counter, job change log,
+#       leaderboard version
+# ARGV: username, challenge, leading zeros of the verified hash, timestamp,
+#       job id, short job id for notes, bonus settings JSON, change log length,
+#       activity log length
+# Returns {status, new balance, hashes completed, total hashes, amount, bonus}
+# where status is inactive, invalid, duplicate, accepted or completed.
+SUBMIT_GROUP_PROOF_LUA = CONVERT_USER_RECORD_LUA + """
+local username = ARGV[1]
+
+if redis.call('HGET', KEYS[1], 'status') ~= 'active' then
+    return {'inactive'}
+end
+local difficulty = tonumber(redis.call('HGET', KEYS[1], 'difficulty'))
+if tonumber(ARGV[3]) < difficulty then
+    return {'invalid'}
+end
+
+local function fmt(n)
+    return string.format('%.17g', n)
+end
+
+local function credit(name, amount, mined)
+    local user_key = 'user:' .. name
+    convert_user(user_key)
+    if redis.call('EXISTS', user_key) == 0 then
+        return false
+    end
+    local balance = redis.call('HINCRBYFLOAT', user_key, 'balance', fmt(amount))
+    redis.call('ZADD', KEYS[5], balance, name)
+    if mined then
+        local total_mined = redis.call('HINCRBYFLOAT', user_key, 'total_mined', fmt(amount))
+        redis.call('ZADD', KEYS[6], total_mined, name)
+    end
+    redis.call('INCRBYFLOAT', KEYS[7], fmt(amount))
+    redis.call('INCR', KEYS[9])
+    return balance
+end
+
+local function log_activity(name, action, amount, note)
+    local log_key = 'activity:' .. name
+    redis.call('LPUSH', log_key, cjson.encode({timestamp = ARGV[4], action = action, amount = amount, note = note}))
+    redis.call('LTRIM', log_key, 0, tonumber(ARGV[9]) - 1)
+end
+
+local reward = tonumber(redis.call('HGET', KEYS[1], 'reward_per_hash'))
+local total_hashes = tonumber(redis.call('HGET', KEYS[1], 'total_hashes'))
+
+-- SREM returns 0 if someone else already solved this challenge
+if redis.call('SREM', KEYS[2], ARGV[2]) == 0 then
+    local consolation = reward * 0.10
+    redis.call('HINCRBY', KEYS[1], 'duplicate_solves', 1)
+    local balance = credit(username, consolation, false)
+    log_activity(username, 'group_mine_dup', consolation, 'Job: ' .. ARGV[6] .. ' (duplicate)')
+    local completed = tonumber(redis.call('HGET', KEYS[1], 'hashes_completed') or 0)
+    return {'duplicate', balance, completed, total_hashes, fmt(consolation)}
+end
+
+local balance = credit(username, reward, true)
+if redis.call('HINCRBY', KEYS[3], username, 1) == 1 then
+    -- The contributors hash expires together with the job
+    local job_ttl = redis.call('TTL', KEYS[1])
+    if job_ttl > 0 then
+        redis.call('EXPIRE', KEYS[3], job_ttl)
+    end
+end
+local completed = redis.call('HINCRBY', KEYS[1], 'hashes_completed', 1)
+log_activity(username, 'group_mine', reward, 'Job: ' .. ARGV[6] .. '...')
+
+-- Record the solve in the bounded change log under the job's next version
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('ZADD', KEYS[8], version, ARGV[2])
+redis.call('ZREMRANGEBYRANK', KEYS[8], 0, -(tonumber(ARGV[8]) + 1))
+if redis.call('TTL', KEYS[8]) == -1 then
+    local job_ttl = redis.call('TTL', KEYS[1])
+    if job_ttl > 0 then
+        redis.call('EXPIRE', KEYS[8], job_ttl)
+    end
+end
+
+local events_channel = 'job:' .. ARGV[5] .. ':events'
+redis.call('PUBLISH', events_channel, cjson.encode({
+    event = 'solved', challenge = ARGV[2], version = version,
+    hashes_completed = completed, total_hashes = total_hashes
+}))
+
+if completed < total_hashes then
+    return {'accepted', balance, completed, total_hashes, fmt(reward)}
+end
+
+redis.call('HSET', KEYS[1], 'status', 'completed')
+redis.call('SREM', KEYS[4], ARGV[5])
+redis.call('PUBLISH', events_channel, cjson.encode({
+    event = 'completed', version = version,
+    hashes_completed = completed, total_hashes = total_hashes
+}))
+
+local settings = cjson.decode(ARGV[7])
+local multiplier = settings.difficulty_multipliers[tostring(difficulty)] or 1.0
+local bonus_amount = settings.base_bonus * (total_hashes / settings.size_unit) * multiplier
+
+local contributors = redis.call('HGETALL', KEYS[3])
+local total_contributions = 0
+for i = 2, #contributors, 2 do
+    total_contributions = total_contributions + tonumber(contributors[i])
+end
+
+local my_bonus = 0
+for i = 1, #contributors, 2 do
+    local name = contributors[i]
+    local user_bonus = bonus_amount * tonumber(contributors[i + 1]) / total_contributions
+    local bonus_balance = credit(name, user_bonus, false)
+    if bonus_balance then
+        log_activity(name, 'group_bonus', user_bonus, 'Job: ' .. ARGV[6] .. ' Completed!')
+    end
+    if name == username then
+        my_bonus = user_bonus
+        balance = bonus_balance or balance
+    end
+end
+
+return {'completed', balance, completed, total_hashes, fmt(reward), fmt(my_bonus)}
+"""
+
+credit_user_script = redis_client.register_script(CREDIT_USER_LUA)
+transfer_script = redis_client.register_script(TRANSFER_LUA)
+register_user_script = redis_client.register_script(REGISTER_USER_LUA)
+submit_group_proof_script = redis_client.register_script(SUBMIT_GROUP_PROOF_LUA)
+claim_offline_proofs_script = redis_client.register_script(CLAIM_OFFLINE_PROOFS_LUA)
+rotate_refresh_token_script = redis_client.register_script(ROTATE_REFRESH_TOKEN_LUA)
+lease_group_challenge_script = redis_client.register_script(LEASE_GROUP_CHALLENGE_LUA)
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -62,6 +788,9 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
+class RefreshPayload(BaseModel):
+    refresh_token: str
+
 class UserResponse(BaseModel):
     username: str
     wallet_address: str
@@ -80,6 +809,22 @@ class MiningResult(BaseModel):
     hash_found: str
     difficulty: int
 
+class MiningChallenge(BaseModel):
+    challenge: str
+    difficulty: int
+    issued_at: float
+    expires_at: float
+    signature: str
+
+class MiningSubmitPayload(BaseModel):
+    challenge: str
+    difficulty: int
+    issued_at: float
+    expires_at: float
+    signature: str
+    nonce: int
+    hash_found: str
+
 class TransferPayload(BaseModel):
     recipient_wallet_address: str
     amount: float
@@ -100,6 +845,34 @@ class GroupJob(BaseModel):
     status: str
     expires_at: str
     challenges: List[str]
+    version: int = 0
+    duplicate_solves: int = 0
+
+    @computed_field
+    @property
+    def duplicate_rate(self) -> float:
+        """Share of solves that hit an already-solved challenge"""
+        solves = self.hashes_completed + self.duplicate_solves
+        return self.duplicate_solves / solves if solves else 0.0
+
+class ChallengeLease(BaseModel):
+    job_id: str
+    challenge: str
+    expires_at: float
+    lease_seconds: int
+    shared_with: int  # other miners holding a lease on the same challenge
+
+class GroupJobChanges(BaseModel):
+    job_id: str
+    version: int
+    status: str
+    hashes_completed: int
+    total_hashes: int
+    solved: List[str]
+    # Set when the change log no longer reaches back to the requested version;
+    # `challenges` then holds the full list of unsolved challenges
+    resync: bool = False
+    challenges: Optional[List[str]] = None
 
 class SubmitProofPayload(BaseModel):
     job_id: str
@@ -107,6 +880,9 @@ class SubmitProofPayload(BaseModel):
     nonce: int
     hash_found: str
 
+class BatchSubmitProofPayload(BaseModel):
+    proofs: List[SubmitProofPayload]
+
 class ActivityLog(BaseModel):
     timestamp: str
     action: str
@@ -116,67 +892,88 @@ class ActivityLog(BaseModel):
 # Helper functions
 def get_est_time():
     """Returns the current time in Eastern Standard Time as an ISO 8601 string."""
-    utc_now = datetime.utcnow().replace(tzinfo=pytz.utc)
-    est_tz = pytz.timezone('US/Eastern')
-    return utc_now.astimezone(est_tz).isoformat()
+    return datetime.now(timezone.utc).astimezone(EST_TZ).isoformat()
 
 def add_activity(username: str, action: str, amount: float, note: str):
-    """Adds a new entry to a user's activity log."""
-    log_key = f"activity:{username}"
+    """Queues a new entry for a user's activity log; run_activity_writer stores it."""
     log_entry = {
         "timestamp": get_est_time(),
         "action": action,
         "amount": amount,
         "note": note
     }
-    # LPUSH adds the new entry to the start of the list
-    redis_client.lpush(log_key, json.dumps(log_entry))
-    # LTRIM keeps the list capped at the most recent 10 entries
-    redis_client.ltrim(log_key, 0, 9)
+    activity_buffer.append((username, json.dumps(log_entry)))
+    if len(activity_buffer) >= ACTIVITY_FLUSH_SIZE:
+        activity_flush_needed.set()
+
+async def flush_activity():
+    """Writes every buffered activity entry in one pipeline."""
+    global activity_buffer
+    if not activity_buffer:
+        return
+    batch, activity_buffer = activity_buffer, []
+
+    entries_by_user = {}
+    for username, entry in batch:
+        entries_by_user.setdefault(username, []).append(entry)
 
-def manage_group_jobs():
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for username, entries in entries_by_user.items():
+                # LPUSH puts the last argument first, so the newest entry ends up at the head
+                pipe.lpush(f"activity:{username}", *entries[-ACTIVITY_LOG_LENGTH:])
+                pipe.ltrim(f"activity:{username}", 0, ACTIVITY_LOG_LENGTH - 1)
+            await pipe.execute()
+    except Exception as e:
+        # Keep the entries for the next attempt, dropping the oldest if Redis stays down
+        activity_buffer = (batch + activity_buffer)[-ACTIVITY_BUFFER_LIMIT:]
+        print(f"Activity log flush failed, {len(activity_buffer)} entries waiting: {e}")
+
+async def run_activity_writer():
+    """Background task that flushes the activity buffer on a short interval."""
+    while True:
+        try:
+            await asyncio.wait_for(activity_flush_needed.wait(), timeout=ACTIVITY_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        activity_flush_needed.clear()
+        await flush_activity()
+
+async def manage_group_jobs():
     """
     Checks active group jobs. If any are completed or expired, replaces them.
-    Ensures there are always 3 active jobs.
+    Ensures there are always ACTIVE_GROUP_JOBS active jobs.
+    Runs from the scheduler task only, never inside a request.
     """
     active_jobs_key = "group_jobs:active"
     
-    # Prune completed or expired jobs
-    active_job_ids = redis_client.smembers(active_jobs_key)
-    for job_id in active_job_ids:
-        job_key = f"job:{job_id}"
-        if not redis_client.exists(job_key) or redis_client.hget(job_key, "status") == "completed":
-            redis_client.srem(active_jobs_key, job_id)
-            continue
-        
-        expires_at_str = redis_client.hget(job_key, "expires_at")
-        if expires_at_str and datetime.fromisoformat(expires_at_str) < datetime.now(timezone.utc):
-            redis_client.hset(job_key, "status", "expired")
-            redis_client.srem(active_jobs_key, job_id)
+    # Prune completed jobs and jobs whose keys have expired
+    active_job_ids = list(await redis_client.smembers(active_jobs_key))
+    if active_job_ids:
+        pipe = redis_client.pipeline(transaction=False)
+        for job_id in active_job_ids:
+            pipe.hget(f"job:{job_id}", "status")
+        statuses = await pipe.execute()
+
+        finished = [job_id for job_id, job_status in zip(active_job_ids, statuses) if job_status != "active"]
+        if finished:
+            await redis_client.srem(active_jobs_key, *finished)
 
     # Replenish jobs if needed
-    while redis_client.scard(active_jobs_key) < 3:
+    while await redis_client.scard(active_jobs_key) < ACTIVE_GROUP_JOBS:
         job_id = secrets.token_hex(8)
         job_key = f"job:{job_id}"
         
         # Check if this job_id somehow already exists to prevent overwriting
-        if redis_client.exists(job_key):
+        if await redis_client.exists(job_key):
             continue
 
         job_size = random.choice([16, 24, 32, 40, 48, 56, 64])
         difficulty = random.choice([5, 6, 7])
         
-        # New reward structure with difficulty multipliers
+        # Reward per hash scales with job size; the completion bonus
+        # (GROUP_JOB_BONUS_SETTINGS) also scales with difficulty
         base_reward_per_hash = 0.001
-        base_bonus = 0.01
-
-        difficulty_multipliers = {
-            5: 1.0,   # Easy
-            6: 1.15,  # Intermediate
-            7: 1.3    # Hard
-        }
-        
-        # Scale base rewards by job size
         size_multiplier = job_size / 16
         reward_per_hash = base_reward_per_hash * size_multiplier
         
@@ -186,19 +983,358 @@ def manage_group_jobs():
             "reward_per_hash": reward_per_hash,
             "difficulty": difficulty,
             "status": "active",
-            "expires_at": (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
+            "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=GROUP_JOB_TTL)).isoformat()
         }
         
         # Create the set of hashes to be solved for this job FIRST
         hashes_to_solve_key = f"job:{job_id}:hashes"
         challenges = [secrets.token_hex(16) for _ in range(job_size)]
         
-        # Use a pipeline to ensure atomicity
+        # Use a pipeline to ensure atomicity; the job keys expire on their own
         pipe = redis_client.pipeline()
         pipe.hset(job_key, mapping=job_data)
+        pipe.expire(job_key, GROUP_JOB_TTL)
         pipe.sadd(hashes_to_solve_key, *challenges)
+        pipe.expire(hashes_to_solve_key, GROUP_JOB_TTL)
         pipe.sadd(active_jobs_key, job_id)
-        pipe.execute()
+        await pipe.execute()
+
+async def run_group_job_scheduler():
+    """
+    Background task that maintains the group jobs. Every worker runs it, but
+    only the one holding the scheduler lock does any work on a given tick.
+    """
+    lock = redis_client.lock(
+        GROUP_JOB_SCHEDULER_LOCK,
+        timeout=GROUP_JOB_SCHEDULER_INTERVAL * 3,
+        blocking=False
+    )
+    try:
+        while True:
+            try:
+                if await lock.owned():
+                    await lock.reacquire()
+                    is_leader = True
+                else:
+                    is_leader = await lock.acquire()
+
+                if is_leader:
+                    await manage_group_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Group job scheduler error: {e}")
+
+            await asyncio.sleep(GROUP_JOB_SCHEDULER_INTERVAL)
+    finally:
+        try:
+            if await lock.owned():
+                await lock.release()
+        except Exception:
+            pass
+
+def verify_group_proof(challenge: str, nonce: int, hash_found: str) -> Optional[int]:
+    """
+    Re-computes a group job proof. Returns the number of leading zeros of the
+    hash, or None if it does not match. The job's difficulty is checked by the script.
+    """
+    verify_hash = hashlib.sha256(f"{challenge}{nonce}".encode()).hexdigest()
+    if verify_hash != hash_found:
+        return None
+    return len(verify_hash) - len(verify_hash.lstrip('0'))
+
+async def run_group_proof_script(username: str, job_id: str, challenge: str, leading_zeros: int, timestamp: str, client=None):
+    """Runs (or queues on a pipeline) the atomic group job submit script for one proof."""
+    return await submit_group_proof_script(
+        keys=[
+            f"job:{job_id}", f"job:{job_id}:hashes", f"job:{job_id}:contributors", "group_jobs:active",
+            "leaderboard", TOTAL_MINED_KEY, SUPPLY_KEY, f"job:{job_id}:changes", LEADERBOARD_VERSION_KEY
+        ],
+        args=[
+            username, challenge, leading_zeros, timestamp,
+            job_id, job_id[:8], GROUP_JOB_BONUS_SETTINGS, GROUP_JOB_CHANGE_LOG_LENGTH, ACTIVITY_LOG_LENGTH
+        ],
+        client=client
+    )
+
+def verify_offline_proofs(proofs: list) -> list:
+    """
+    Checks a chunk of offline proofs. Runs in the sync worker pool.
+    Returns (proof id, reward, hash) for every valid proof, in upload order.
+    """
+    valid_proofs = []
+
+    for proof in proofs:
+        # Basic validation of proof structure
+        try:
+            challenge = str(proof['challenge'])
+            nonce = int(proof['nonce'])
+            hash_found = proof['hash_found']
+            difficulty = int(proof['difficulty'])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+        # Re-calculate the hash to verify the proof
+        verify_hash = hashlib.sha256(f"{challenge}{nonce}".encode()).hexdigest()
+
+        if verify_hash == hash_found and verify_hash.startswith('0' * difficulty):
+            # Proof is valid, calculate reward (must match online rewards)
+            base_reward = 0.0005 # Reduced from 0.001
+            difficulty_bonus = difficulty * 0.0005
+            valid_proofs.append((offline_proof_id(challenge, nonce), base_reward + difficulty_bonus, verify_hash))
+
+    return valid_proofs
+
+def offline_proof_id(challenge: str, nonce: int) -> str:
+    """Identifies an offline proof in the replay filter (128-bit hex digest)."""
+    return hashlib.blake2b(f"{challenge}:{nonce}".encode(), digest_size=16).hexdigest()
+
+def replay_filter_offsets(proof_id: str) -> list:
+    """Bit positions of a proof within one filter slot, by double hashing its id."""
+    digest = int(proof_id, 16)
+    h1 = digest >> 64
+    h2 = (digest & 0xFFFFFFFFFFFFFFFF) | 1
+    return [(h1 + i * h2) % SYNC_FILTER_SLOT_BITS for i in range(SYNC_FILTER_HASHES)]
+
+async def claim_offline_proofs(proof_ids: list, client=None) -> list:
+    """
+    Records offline proofs in the replay filter and returns, for each id, True
+    if it has not been paid before. The rotation, the probes and the recent
+    window update run as one script, so the whole batch costs a single round trip.
+    Filter hits missing from the exact recent window are only logged, as possible
+    false positives; they are still refused, since an id that has left the
+    window may be an older replay.
+    """
+    client = client or redis_client
+    if not proof_ids:
+        return []
+
+    args = [
+        SYNC_FILTER_CAPACITY, SYNC_FILTER_SLOT_BYTES, SYNC_FILTER_SLOTS, SYNC_FILTER_HASHES,
+        SYNC_RECENT_WINDOW, time.time()
+    ]
+    for proof_id in proof_ids:
+        args.append(proof_id)
+        args.extend(replay_filter_offsets(proof_id))
+
+    unconfirmed, flags = await claim_offline_proofs_script(
+        keys=[SYNC_FILTER_META_KEY, SYNC_FILTER_KEY, SYNC_RECENT_KEY],
+        args=args,
+        client=client
+    )
+    fresh = [flag == 1 for flag in flags]
+
+    if unconfirmed:
+        print(f"Replay filter: {unconfirmed} of {fresh.count(False)} rejected proofs were not in the recent window")
+
+    return fresh
+
+def get_sync_verify_executor() -> ProcessPoolExecutor:
+    """Returns the process pool used to verify offline proofs and run legacy /mine searches, creating it on first use."""
+    global sync_verify_executor
+    if sync_verify_executor is None:
+        sync_verify_executor = ProcessPoolExecutor(
+            max_workers=SYNC_VERIFY_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return sync_verify_executor
+
+async def iter_ndjson_chunks(stream, chunk_size: int):
+    """
+    Parses an NDJSON request body as it arrives, yielding lists of at most
+    chunk_size decoded lines. Lines that are not JSON objects are yielded as None
+    so they are counted as invalid proofs.
+    """
+    buffer = b""
+    chunk = []
+    async for data in stream:
+        buffer += data
+        if len(buffer) > SYNC_MAX_LINE_BYTES and b"\n" not in buffer:
+            raise HTTPException(status_code=400, detail="Proof line too long.")
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                proof = json.loads(line)
+            except ValueError:
+                proof = None
+            chunk.append(proof if isinstance(proof, dict) else None)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if buffer.strip():
+        try:
+            proof = json.loads(buffer)
+        except ValueError:
+            proof = None
+        chunk.append(proof if isinstance(proof, dict) else None)
+    if chunk:
+        yield chunk
+
+async def iter_list_chunks(proofs: list, chunk_size: int):
+    """Splits an already-parsed proof list into chunks (legacy JSON /sync bodies)."""
+    for start in range(0, len(proofs), chunk_size):
+        yield proofs[start:start + chunk_size]
+
+def sign_mining_challenge(username: str, challenge: str, difficulty: int, issued_at: float, expires_at: float) -> str:
+    """Returns the HMAC signature binding a mining challenge to a user and its validity window."""
+    message = f"{username}:{challenge}:{difficulty}:{issued_at:.3f}:{expires_at:.3f}"
+    return hmac.new(SECRET_KEY.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+def issue_mining_challenge(username: str) -> MiningChallenge:
+    """Creates a new signed online mining challenge for the given user."""
+    challenge = secrets.token_hex(16)
+    issued_at = round(time.time(), 3)
+    expires_at = round(issued_at + MINE_CHALLENGE_TTL, 3)
+    return MiningChallenge(
+        challenge=challenge,
+        difficulty=MINE_DIFFICULTY,
+        issued_at=issued_at,
+        expires_at=expires_at,
+        signature=sign_mining_challenge(username, challenge, MINE_DIFFICULTY, issued_at, expires_at)
+    )
+
+def calculate_mining_reward(difficulty: int, time_taken: float) -> float:
+    """Online mining reward: base + difficulty bonus + time bonus."""
+    base_reward = 0.0005  # Reduced from 0.001
+    difficulty_bonus = difficulty * 0.0005
+    time_bonus = max(0, (MINE_TIME_LIMIT - time_taken) * 0.0001)
+    return base_reward + difficulty_bonus + time_bonus
+
+# Nonce suffixes for search_nonce: nonces are searched in groups of 1000 that
+# share their leading digits, which are absorbed into the hash state once per group
+NONCE_PLAIN_SUFFIXES = [str(low).encode() for low in range(1000)]
+NONCE_PADDED_SUFFIXES = [f"{low:03d}".encode() for low in range(1000)]
+
+def search_nonce(challenge: str, difficulty: int, time_limit: float):
+    """
+    Brute-forces a nonce for the challenge. Returns (nonce, hash) or (None, None) on timeout.
+    Same kernel as the client's nonce_search: the challenge's hash state is copied per
+    nonce and raw digests are compared against a bound instead of formatting hex.
+    """
+    deadline = time.time() + time_limit
+    bound = bytes.fromhex('0' * difficulty + 'f' * (64 - difficulty))
+    challenge_state = hashlib.sha256(challenge.encode())
+    group = 0
+    while time.time() < deadline:
+        if group:
+            group_state = challenge_state.copy()
+            group_state.update(str(group).encode())
+            suffixes = NONCE_PADDED_SUFFIXES
+        else:
+            group_state = challenge_state
+            suffixes = NONCE_PLAIN_SUFFIXES
+        for low, suffix in enumerate(suffixes):
+            state = group_state.copy()
+            state.update(suffix)
+            if state.digest() <= bound:
+                return group * 1000 + low, state.hexdigest()
+        group += 1
+    return None, None
+
+async def credit_online_mining(username: str, coins_earned: float, hash_found: str) -> Optional[float]:
+    """Credits an online mining reward to the user and returns the new balance."""
+    new_balance = await credit_user(username, coins_earned, mined=coins_earned)
+
+    # Add activity log entry
+    add_activity(username, "mine_online", coins_earned, f"Hash: {hash_found[:12]}...")
+    return new_balance
+
+async def credit_user(username: str, amount: float, mined: float = 0.0, client=None):
+    """
+    Atomically adds `amount` to the user's balance and `mined` to total_mined,
+    updating the leaderboard indexes and coin supply in the same step.
+    Returns the new balance, or None if the user does not exist. Pass a
+    pipeline as `client` to queue the credit instead of running it.
+    """
+    result = await credit_user_script(
+        keys=[f"user:{username}", "leaderboard", TOTAL_MINED_KEY, SUPPLY_KEY, LEADERBOARD_VERSION_KEY],
+        args=[username, amount, mined],
+        client=client
+    )
+    if client is not None:
+        return None
+    return float(result) if result is not None else None
+
+async def migrate_user_records() -> int:
+    """
+    Converts user records stored as JSON strings into hashes. Safe to run
+    repeatedly and from several workers at once. Returns the number converted.
+    """
+    migrated = 0
+    async for key in redis_client.scan_iter(match="user:*", count=500):
+        if await convert_user_record(key):
+            migrated += 1
+    return migrated
+
+async def convert_user_record(key: str) -> bool:
+    """Converts one user record from a JSON string into a hash. Returns True if this call converted it."""
+    async with redis_client.pipeline() as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.type(key) != "string":
+                return False
+            user_data = json.loads(await pipe.get(key))
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=user_data)
+            await pipe.execute()
+            return True
+        except redis.WatchError:
+            # Another worker touched the record first and converted it
+            return False
+
+async def user_record_command(command, username: str, *args):
+    """
+    Runs a hash command such as redis_client.hgetall on the user's record. A
+    record written as a JSON string by an older instance fails with WRONGTYPE;
+    it is converted and the command run again.
+    """
+    key = f"user:{username}"
+    try:
+        return await command(key, *args)
+    except redis.ResponseError as e:
+        if "WRONGTYPE" not in str(e):
+            raise
+        await convert_user_record(key)
+        return await command(key, *args)
+
+async def backfill_total_mined(usernames: List[str]) -> dict:
+    """Copies total_mined from user records into the leaderboard index. Returns {username: total_mined}."""
+    pipe = redis_client.pipeline(transaction=False)
+    for username in usernames:
+        pipe.hget(f"user:{username}", "total_mined")
+    total_mined_values = await pipe.execute(raise_on_error=False)
+    for i, (username, total_mined) in enumerate(zip(usernames, total_mined_values)):
+        if isinstance(total_mined, redis.ResponseError):
+            total_mined_values[i] = await user_record_command(redis_client.hget, username, "total_mined")
+
+    backfilled = {
+        username: float(total_mined)
+        for username, total_mined in zip(usernames, total_mined_values)
+        if total_mined is not None
+    }
+    if backfilled:
+        await redis_client.zadd(TOTAL_MINED_KEY, backfilled)
+    return backfilled
+
+async def reconcile_stats() -> dict:
+    """
+    Rebuilds the supply and user-count counters from the leaderboard.
+    The leaderboard holds every user's balance, so its sum is the coin supply.
+    """
+    total_coins = 0.0
+    total_users = 0
+    async for _, balance in redis_client.zscan_iter("leaderboard", count=1000):
+        total_coins += balance
+        total_users += 1
+
+    await redis_client.mset({SUPPLY_KEY: total_coins, USER_COUNT_KEY: total_users})
+    return {
+        "total_coins_in_circulation": total_coins,
+        "total_users": total_users
+    }
 
 def generate_wallet_address():
     """Generate a unique wallet address"""
@@ -206,77 +1342,198 @@ def generate_wallet_address():
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=PASSWORD_HASH_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify a password against its hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def get_user_by_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get user from JWT token"""
+def password_needs_rehash(hashed: str) -> bool:
+    """True if a stored bcrypt hash ($2b$<rounds>$...) uses a different cost factor"""
     try:
-        token = credentials.credentials
-        # Simple token validation (in production, use proper JWT)
-        user_data = redis_client.get(f"token:{token}")
-        if not user_data:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return json.loads(user_data)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        return int(hashed.split('$')[2]) != PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return False
 
-@app.post("/sync", status_code=status.HTTP_200_OK)
-async def sync_offline_activity(payload: SyncPayload, current_user: dict = Depends(get_user_by_token)):
+async def run_password_hashing(func, *args):
     """
-    Validates and syncs proofs of work done offline.
+    Runs hash_password or verify_password on the bcrypt pool. Raises 503 with
+    Retry-After once PASSWORD_HASH_QUEUE calls are already running or waiting.
     """
-    user_data_str = redis_client.get(f"user:{current_user['username']}")
-    if not user_data_str:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    user_data = json.loads(user_data_str)
-    
-    total_coins_earned = 0.0
-    valid_proofs_count = 0
+    if password_hash_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+        )
 
-    for proof in payload.proofs:
-        # Basic validation of proof structure
-        if not all(k in proof for k in ['challenge', 'nonce', 'hash_found', 'difficulty']):
-            continue # or raise a specific error
+    async with password_hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_hash_executor, func, *args)
+
+def create_access_token(username: str, wallet_address: str, token_id: str) -> str:
+    """Signs an access token for one login session"""
+    now = int(time.time())
+    claims = {
+        "sub": username,
+        "wallet": wallet_address,
+        "jti": token_id,
+        "iat": now,
+        "exp": now + ACCESS_TOKEN_TTL
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=TOKEN_ALGORITHM)
 
-        challenge = proof['challenge']
-        nonce = proof['nonce']
-        hash_found = proof['hash_found']
-        difficulty = proof['difficulty']
+def hash_refresh_secret(secret: str) -> str:
+    """Refresh token secrets are only stored as SHA-256 hashes"""
+    return hashlib.sha256(secret.encode()).hexdigest()
 
-        # Re-calculate the hash to verify the proof
-        test_string = f"{challenge}{nonce}"
-        verify_hash = hashlib.sha256(test_string.encode()).hexdigest()
+async def start_session(username: str, wallet_address: str) -> dict:
+    """
+    Opens a login session and returns its access and refresh tokens. The user's
+    previous session, if any, is ended to enforce one session at a time.
+    """
+    session_id = secrets.token_urlsafe(16)
+    refresh_secret = secrets.token_urlsafe(32)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(f"refresh:{session_id}", mapping={
+            "username": username,
+            "wallet_address": wallet_address,
+            "token_hash": hash_refresh_secret(refresh_secret)
+        })
+        pipe.expire(f"refresh:{session_id}", REFRESH_TOKEN_TTL)
+        pipe.set(f"user_token:{username}", session_id, ex=REFRESH_TOKEN_TTL, get=True)
+        _, _, old_session_id = await pipe.execute()
+
+    if old_session_id:
+        await end_session(old_session_id)
 
-        if verify_hash == hash_found and verify_hash.startswith('0' * difficulty):
-            # Proof is valid, calculate reward (must match online rewards)
-            base_reward = 0.0005 # Reduced from 0.001
-            difficulty_bonus = difficulty * 0.0005
-            coins_earned = base_reward + difficulty_bonus
-            total_coins_earned += coins_earned
-            valid_proofs_count += 1
+    return {
+        "token": create_access_token(username, wallet_address, session_id),
+        "refresh_token": f"{session_id}.{refresh_secret}",
+        "username": username
+    }
 
-    if valid_proofs_count > 0:
-        user_data["balance"] += total_coins_earned
-        user_data["total_mined"] += total_coins_earned
-        
-        # Save updated user data
-        redis_client.set(f"user:{current_user['username']}", json.dumps(user_data))
-        
-        # Update leaderboard
-        redis_client.zadd("leaderboard", {current_user['username']: user_data["balance"]})
+async def end_session(session_id: str):
+    """Revokes a session's access tokens and deletes its refresh token."""
+    # Any access token issued for the session expires within ACCESS_TOKEN_TTL
+    await revoke_token(session_id, time.time() + ACCESS_TOKEN_TTL)
+    await redis_client.delete(f"refresh:{session_id}")
+
+async def revoke_token(token_id: str, expires_at: float):
+    """Adds a session id to the denylist, here at once and on other workers at their next refresh."""
+    revoked_tokens[token_id] = expires_at
+    await redis_client.zadd(REVOKED_TOKENS_KEY, {token_id: expires_at})
+
+async def refresh_revoked_tokens():
+    """Replaces the in-memory denylist with the unexpired entries in Redis."""
+    global revoked_tokens
+    now = time.time()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(REVOKED_TOKENS_KEY, "-inf", now)
+        pipe.zrangebyscore(REVOKED_TOKENS_KEY, now, "+inf", withscores=True)
+        _, entries = await pipe.execute()
+    revoked_tokens = dict(entries)
+
+async def run_token_denylist_refresh():
+    """Background task that keeps revoked_tokens in step with Redis."""
+    while True:
+        try:
+            await refresh_revoked_tokens()
+        except Exception as e:
+            print(f"Token denylist refresh failed: {e}")
+        await asyncio.sleep(TOKEN_DENYLIST_REFRESH)
+
+async def get_user_by_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get user from JWT token"""
+    return decode_access_token(credentials.credentials)
+
+def decode_access_token(token: str) -> dict:
+    """Checks an access token's signature, expiry and revocation and returns its user"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[TOKEN_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if claims.get("jti") in revoked_tokens:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {"username": claims["sub"], "wallet_address": claims["wallet"]}
 
+@app.post("/sync", status_code=status.HTTP_200_OK)
+async def sync_offline_activity(request: Request, current_user: dict = Depends(get_user_by_token)):
+    """
+    Validates and syncs proofs of work done offline.
+    Accepts a streamed NDJSON body (one proof per line, Content-Type
+    application/x-ndjson) or the older {"proofs": [...]} JSON body. Proofs are
+    verified in chunks on the worker pool and each chunk is credited as soon as
+    it is verified, so memory stays flat however large the upload is. Proofs
+    that were already paid out (see claim_offline_proofs) earn nothing.
+    """
+    username = current_user['username']
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        chunks = iter_ndjson_chunks(request.stream(), SYNC_CHUNK_SIZE)
+    else:
+        try:
+            payload = SyncPayload(**await request.json())
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected {\"proofs\": [...]} or an NDJSON body.")
+        chunks = iter_list_chunks(payload.proofs, SYNC_CHUNK_SIZE)
+
+    loop = asyncio.get_running_loop()
+    executor = get_sync_verify_executor()
+    max_in_flight = SYNC_VERIFY_WORKERS * 2
+    in_flight = deque()
+    chunk_summaries = []
+    totals = {"proofs": 0, "valid": 0, "duplicates": 0, "coins": 0.0, "last_hash": "", "balance": None}
+
+    async def finish_oldest_chunk():
+        proofs_in_chunk, future = in_flight.popleft()
+        valid_proofs = await future
+        fresh = await claim_offline_proofs([proof_id for proof_id, _, _ in valid_proofs])
+        paid_proofs = [proof for proof, is_fresh in zip(valid_proofs, fresh) if is_fresh]
+        coins_earned = sum((reward for _, reward, _ in paid_proofs), 0.0)
+        if paid_proofs:
+            totals["balance"] = await credit_user(username, coins_earned, mined=coins_earned)
+            if totals["balance"] is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            totals["last_hash"] = paid_proofs[-1][2]
+        totals["valid"] += len(paid_proofs)
+        totals["duplicates"] += len(valid_proofs) - len(paid_proofs)
+        totals["coins"] += coins_earned
+        chunk_summaries.append({
+            "chunk": len(chunk_summaries) + 1,
+            "proofs": proofs_in_chunk,
+            "valid": len(paid_proofs),
+            "duplicates": len(valid_proofs) - len(paid_proofs),
+            "coins_synced": coins_earned
+        })
+
+    async for chunk in chunks:
+        totals["proofs"] += len(chunk)
+        proofs = [proof for proof in chunk if proof is not None]
+        in_flight.append((len(chunk), loop.run_in_executor(executor, verify_offline_proofs, proofs)))
+        if len(in_flight) >= max_in_flight:
+            await finish_oldest_chunk()
+
+    while in_flight:
+        await finish_oldest_chunk()
+
+    new_balance = totals["balance"]
+    if new_balance is None:
+        new_balance = await user_record_command(redis_client.hget, username, "balance")
+        if new_balance is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    if totals["valid"] > 0:
         # Add activity log entry
-        add_activity(current_user['username'], "sync_offline", total_coins_earned, f"Hash: {hash_found[:12]}...")
+        add_activity(username, "sync_offline", totals["coins"], f"Hash: {totals['last_hash'][:12]}...")
 
     return {
-        "message": f"Sync successful. Validated {valid_proofs_count} of {len(payload.proofs)} proofs.",
-        "total_coins_synced": total_coins_earned,
-        "new_balance": user_data["balance"]
+        "message": f"Sync successful. Validated {totals['valid']} of {totals['proofs']} proofs.",
+        "total_coins_synced": totals["coins"],
+        "duplicates": totals["duplicates"],
+        "new_balance": float(new_balance),
+        "chunks": chunk_summaries
     }
 
 # API Routes
@@ -287,29 +1544,22 @@ async def root():
 @app.post("/register", response_model=UserResponse)
 async def register_user(user: UserCreate):
     """Register a new user"""
-    # Check if username already exists
-    if redis_client.exists(f"user:{user.username}"):
+    # Check if username already exists before paying for the password hash
+    if await redis_client.exists(f"user:{user.username}"):
         raise HTTPException(status_code=400, detail="Username already exists")
     
     # Create user
     wallet_address = generate_wallet_address()
-    hashed_password = hash_password(user.password)
-    
-    user_data = {
-        "username": user.username,
-        "password_hash": hashed_password,
-        "wallet_address": wallet_address,
-        "balance": 0.0,
-        "total_mined": 0.0,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    # Store user data
-    redis_client.set(f"user:{user.username}", json.dumps(user_data))
-    redis_client.set(f"wallet:{wallet_address}", user.username)
+    hashed_password = await run_password_hashing(hash_password, user.password)
     
-    # Add to leaderboard
-    redis_client.zadd("leaderboard", {user.username: 0.0})
+    # Another registration for the same name may have finished while we were
+    # hashing, so the script claims the name and writes the user in one step
+    created = await register_user_script(
+        keys=[f"user:{user.username}", f"wallet:{wallet_address}", "leaderboard", TOTAL_MINED_KEY, USER_COUNT_KEY, LEADERBOARD_VERSION_KEY],
+        args=[user.username, hashed_password, wallet_address, datetime.now().isoformat()]
+    )
+    if not created:
+        raise HTTPException(status_code=400, detail="Username already exists")
     
     return UserResponse(
         username=user.username,
@@ -322,47 +1572,70 @@ async def register_user(user: UserCreate):
 async def login_user(user: UserLogin):
     """Login user and return token"""
     # Get user data
-    user_data = redis_client.get(f"user:{user.username}")
+    user_data = await user_record_command(redis_client.hgetall, user.username)
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user_data = json.loads(user_data)
-    
     # Verify password
-    if not verify_password(user.password, user_data["password_hash"]):
+    if not await run_password_hashing(verify_password, user.password, user_data["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Upgrade the stored hash if the cost factor has changed; if the pool is
+    # busy this simply waits for a later login
+    if password_needs_rehash(user_data["password_hash"]) and not password_hash_slots.locked():
+        new_hash = await run_password_hashing(hash_password, user.password)
+        await user_record_command(redis_client.hset, user.username, "password_hash", new_hash)
     
-    # Invalidate any old tokens for this user to enforce one session at a time
-    old_token = redis_client.get(f"user_token:{user.username}")
-    if old_token:
-        redis_client.delete(f"token:{old_token}")
-
-    # Generate token
-    token = secrets.token_urlsafe(32)
-    redis_client.setex(f"token:{token}", 3600, json.dumps({
-        "username": user.username,
-        "wallet_address": user_data["wallet_address"]
-    }))
-    # Store a reverse mapping to find and invalidate old tokens
-    redis_client.setex(f"user_token:{user.username}", 3600, token)
-    
-    return {"token": token, "username": user.username}
+    return await start_session(user.username, user_data["wallet_address"])
+
+@app.post("/refresh")
+async def refresh_access_token(payload: RefreshPayload):
+    """Exchanges a refresh token for a new access token and a new refresh token"""
+    session_id, _, secret = payload.refresh_token.partition(".")
+    if not session_id or not secret:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    new_secret = secrets.token_urlsafe(32)
+    result = await rotate_refresh_token_script(
+        keys=[f"refresh:{session_id}"],
+        args=[session_id, hash_refresh_secret(secret), hash_refresh_secret(new_secret), REFRESH_TOKEN_TTL]
+    )
+
+    if result[0] == -1:
+        # An already-used refresh token came back, so it may have been copied;
+        # the script has ended the session, now cut off its access tokens too
+        await revoke_token(session_id, time.time() + ACCESS_TOKEN_TTL)
+    if result[0] != 1:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    username, wallet_address = result[1], result[2]
+    return {
+        "token": create_access_token(username, wallet_address, session_id),
+        "refresh_token": f"{session_id}.{new_secret}",
+        "username": username
+    }
 
 @app.post("/logout", status_code=status.HTTP_200_OK)
 async def logout_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Invalidates the user's current token, effectively logging them out."""
-    token = credentials.credentials
-    user_data_str = redis_client.get(f"token:{token}")
-    
-    # Find the associated user and remove the reverse mapping
-    if user_data_str:
-        user_data = json.loads(user_data_str)
-        username = user_data.get("username")
-        if username:
-            redis_client.delete(f"user_token:{username}")
-    
-    # Delete the primary token
-    redis_client.delete(f"token:{token}")
+    try:
+        # An expired access token still names a session its refresh token can
+        # renew, so only the signature is checked here
+        claims = jwt.decode(
+            credentials.credentials, SECRET_KEY, algorithms=[TOKEN_ALGORITHM],
+            options={"verify_exp": False}
+        )
+    except JWTError:
+        # Tokens we did not sign belong to no session
+        return {"message": "Logged out successfully"}
+
+    token_id = claims.get("jti")
+    username = claims.get("sub")
+    if token_id:
+        await end_session(token_id)
+        # Remove the session mapping unless a newer login has replaced it
+        if username and await redis_client.get(f"user_token:{username}") == token_id:
+            await redis_client.delete(f"user_token:{username}")
     
     return {"message": "Logged out successfully"}
 
@@ -380,39 +1653,26 @@ async def transfer_coins(payload: TransferPayload, current_user: dict = Depends(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Transfer amount must be positive.")
 
     # Find recipient's username from their wallet address
-    recipient_username = redis_client.get(f"wallet:{recipient_wallet_address}")
+    recipient_username = await redis_client.get(f"wallet:{recipient_wallet_address}")
     if not recipient_username:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recipient wallet address not found.")
 
     if sender_username == recipient_username:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot send coins to yourself.")
 
-    # --- Get User Data ---
-    sender_data_str = redis_client.get(f"user:{sender_username}")
-    recipient_data_str = redis_client.get(f"user:{recipient_username}")
+    # --- Perform Transaction ---
+    # The balance check, debit, credit and leaderboard update run as one atomic script
+    result = await transfer_script(
+        keys=[f"user:{sender_username}", f"user:{recipient_username}", "leaderboard", LEADERBOARD_VERSION_KEY],
+        args=[sender_username, recipient_username, amount]
+    )
 
-    if not sender_data_str or not recipient_data_str:
+    if result[0] == -1:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User data not found.")
-
-    sender_data = json.loads(sender_data_str)
-    recipient_data = json.loads(recipient_data_str)
-
-    # Check for sufficient balance
-    if sender_data["balance"] < amount:
+    if result[0] == 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Insufficient funds.")
 
-    # --- Perform Transaction ---
-    sender_data["balance"] -= amount
-    recipient_data["balance"] += amount
-
-    # --- Update Database ---
-    # Use a pipeline for atomicity
-    pipe = redis_client.pipeline()
-    pipe.set(f"user:{sender_username}", json.dumps(sender_data))
-    pipe.set(f"user:{recipient_username}", json.dumps(recipient_data))
-    pipe.zadd("leaderboard", {sender_username: sender_data["balance"]})
-    pipe.zadd("leaderboard", {recipient_username: recipient_data["balance"]})
-    pipe.execute()
+    sender_new_balance = float(result[1])
 
     # --- Add Activity Logs ---
     add_activity(sender_username, "send", -amount, f"To: {recipient_username[:8]}...")
@@ -420,24 +1680,24 @@ async def transfer_coins(payload: TransferPayload, current_user: dict = Depends(
 
     return {
         "message": "Transfer successful",
-        "sender_new_balance": sender_data["balance"],
+        "sender_new_balance": sender_new_balance,
         "recipient_username": recipient_username
     }
 
 @app.get("/stats", response_model=StatsResponse)
 async def get_app_stats():
     """
-    Calculates and returns application-wide statistics.
+    Returns application-wide statistics from the running supply and user counters.
     """
-    # Get all scores (balances) from the leaderboard
-    all_users_with_scores = redis_client.zrange("leaderboard", 0, -1, withscores=True)
-    
-    total_coins = sum(score for member, score in all_users_with_scores)
-    total_users = len(all_users_with_scores)
+    total_coins, total_users = await redis_client.mget(SUPPLY_KEY, USER_COUNT_KEY)
+
+    # Seeded at startup; this only runs if the counters were deleted since
+    if total_users is None:
+        return await reconcile_stats()
 
     return {
-        "total_coins_in_circulation": total_coins,
-        "total_users": total_users
+        "total_coins_in_circulation": float(total_coins or 0.0),
+        "total_users": int(total_users)
     }
 
 @app.post("/admin/clear-all-jobs", status_code=200)
@@ -446,33 +1706,38 @@ async def admin_clear_jobs():
     TEMPORARY ADMIN FUNCTION: Deletes all active group jobs, forcing regeneration.
     """
     active_jobs_key = "group_jobs:active"
-    active_job_ids = redis_client.smembers(active_jobs_key)
+    active_job_ids = await redis_client.smembers(active_jobs_key)
     
     pipe = redis_client.pipeline()
     for job_id in active_job_ids:
-        pipe.delete(f"job:{job_id}")
-        pipe.delete(f"job:{job_id}:hashes")
-        pipe.delete(f"job:{job_id}:contributors")
+        pipe.delete(
+            f"job:{job_id}", f"job:{job_id}:hashes", f"job:{job_id}:contributors", f"job:{job_id}:changes",
+            f"job:{job_id}:leases", f"job:{job_id}:lease_expiry", f"job:{job_id}:lease_holders"
+        )
     
     pipe.delete(active_jobs_key)
-    pipe.execute()
+    await pipe.execute()
 
-    return {"message": f"Successfully deleted {len(active_job_ids)} active jobs. New jobs will be generated on the next request to /groupjobs."}
+    return {"message": f"Successfully deleted {len(active_job_ids)} active jobs. New jobs will be generated on the next scheduler run."}
 
 @app.get("/groupjobs", response_model=List[GroupJob])
 async def get_group_jobs(current_user: dict = Depends(get_user_by_token)):
     """
-    Manages and retrieves the list of active group jobs.
+    Retrieves the list of active group jobs. Jobs are maintained by the
+    background scheduler, so this only reads.
     """
-    manage_group_jobs() # Ensure jobs are up-to-date before serving
-    
-    active_job_ids = redis_client.smembers("group_jobs:active")
-    jobs = []
+    active_job_ids = list(await redis_client.smembers("group_jobs:active"))
+
+    pipe = redis_client.pipeline(transaction=False)
     for job_id in active_job_ids:
-        job_data = redis_client.hgetall(f"job:{job_id}")
+        pipe.hgetall(f"job:{job_id}")
+        # Also fetch the list of unsolved challenges
+        pipe.smembers(f"job:{job_id}:hashes")
+    results = await pipe.execute()
+
+    jobs = []
+    for job_id, job_data, challenges in zip(active_job_ids, results[0::2], results[1::2]):
         if job_data:
-            # Also fetch the list of unsolved challenges
-            challenges = redis_client.smembers(f"job:{job_id}:hashes")
             job_data['challenges'] = list(challenges)
             jobs.append(GroupJob(job_id=job_id, **job_data))
     return sorted(jobs, key=lambda j: j.total_hashes)
@@ -484,181 +1749,286 @@ async def get_group_job(job_id: str, current_user: dict = Depends(get_user_by_to
     Retrieves the details of a single group job.
     """
     job_key = f"job:{job_id}"
-    if not redis_client.exists(job_key):
+    if not await redis_client.exists(job_key):
         raise HTTPException(status_code=404, detail="Job not found.")
 
-    job_data = redis_client.hgetall(job_key)
-    challenges = redis_client.smembers(f"job:{job_id}:hashes")
+    job_data = await redis_client.hgetall(job_key)
+    challenges = await redis_client.smembers(f"job:{job_id}:hashes")
     job_data['challenges'] = list(challenges)
 
     return GroupJob(job_id=job_id, **job_data)
 
 
+@app.post("/groupjob/{job_id}/lease", response_model=ChallengeLease)
+async def lease_group_job_challenge(job_id: str, renew: bool = False, current_user: dict = Depends(get_user_by_token)):
+    """
+    Leases an unsolved challenge of a group job to the caller for
+    GROUP_JOB_LEASE_TTL seconds, picking the one the fewest other miners hold.
+    Each call replaces the caller's previous lease for the job; with renew=true
+    the current lease is extended instead, as long as it is still unsolved.
+    """
+    result = await lease_group_challenge_script(
+        keys=[
+            f"job:{job_id}", f"job:{job_id}:hashes", f"job:{job_id}:leases",
+            f"job:{job_id}:lease_expiry", f"job:{job_id}:lease_holders"
+        ],
+        args=[current_user['username'], time.time(), GROUP_JOB_LEASE_TTL, int(renew)]
+    )
+    if not result:
+        raise HTTPException(status_code=404, detail="Job not found or no longer active.")
+
+    return ChallengeLease(
+        job_id=job_id,
+        challenge=result[0],
+        expires_at=float(result[1]),
+        lease_seconds=GROUP_JOB_LEASE_TTL,
+        shared_with=int(result[2])
+    )
+
+
+@app.get("/groupjob/{job_id}/changes", response_model=GroupJobChanges)
+async def get_group_job_changes(job_id: str, since: int = 0, current_user: dict = Depends(get_user_by_token)):
+    """
+    Returns the challenges solved in a group job after version `since`.
+    Miners poll this instead of re-downloading the whole challenge list.
+    """
+    job_key = f"job:{job_id}"
+    changes_key = f"job:{job_id}:changes"
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hmget(job_key, "version", "status", "hashes_completed", "total_hashes")
+    pipe.zrangebyscore(changes_key, f"({since}", "+inf")
+    pipe.zrange(changes_key, 0, 0, withscores=True)
+    (version, job_status, hashes_completed, total_hashes), solved, oldest = await pipe.execute()
+
+    if job_status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    version = int(version or 0)
+    changes = GroupJobChanges(
+        job_id=job_id,
+        version=version,
+        status=job_status,
+        hashes_completed=int(hashes_completed or 0),
+        total_hashes=int(total_hashes),
+        solved=solved
+    )
+
+    # The log must cover every version after `since`, otherwise send the full list
+    oldest_version = int(oldest[0][1]) if oldest else version + 1
+    if since > version or (since < version and oldest_version > since + 1):
+        changes.resync = True
+        changes.solved = []
+        changes.challenges = list(await redis_client.smembers(f"job:{job_id}:hashes"))
+
+    return changes
+
+
+async def run_group_job_event_listener():
+    """Background task that relays published group job events to this worker's sockets."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.psubscribe(GROUP_JOB_EVENTS_PATTERN)
+            while True:
+                # Poll with a timeout rather than block, as reads are subject to the socket timeout
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                job_id = message["channel"].split(":")[1]
+                for queue in group_job_subscribers.get(job_id, ()):
+                    queue.put_nowait(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Group job event listener failed, reconnecting: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+@app.websocket("/ws/groupjob/{job_id}")
+async def group_job_feed(websocket: WebSocket, job_id: str):
+    """
+    Pushes a group job's events as they happen: {"event": "solved", "challenge",
+    "version", ...} for every solve and {"event": "completed", ...} at the end.
+    Authenticates with the usual Authorization: Bearer header. Events published
+    before the socket opened are not replayed; fetch /groupjob/{job_id}/changes
+    once connected to catch up.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    try:
+        decode_access_token(authorization.removeprefix("Bearer "))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = asyncio.Queue()
+    group_job_subscribers.setdefault(job_id, set()).add(queue)
+
+    async def send_events():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(send_events())
+    try:
+        # The miner never sends anything; this returns once it disconnects
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        subscribers = group_job_subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del group_job_subscribers[job_id]
+
 @app.post("/groupjobs/submit", status_code=status.HTTP_200_OK)
 async def submit_group_job_proof(payload: SubmitProofPayload, current_user: dict = Depends(get_user_by_token)):
     """
     Submits a proof of work for a single hash in a group job.
+    The claim and every write it causes happen in one atomic script (one round trip).
     """
     job_id = payload.job_id
     challenge = payload.challenge # This is one of the hashes from the job's set
-    nonce = payload.nonce
-    hash_found = payload.hash_found
-
-    job_key = f"job:{job_id}"
-    hashes_to_solve_key = f"job:{job_id}:hashes"
-
-    # --- Validation ---
-    if not redis_client.exists(job_key) or redis_client.hget(job_key, "status") != "active":
-        raise HTTPException(status_code=400, detail="This job is no longer active.")
 
-    # Verify the proof of work itself
-    difficulty = int(redis_client.hget(job_key, "difficulty"))
-    test_string = f"{challenge}{nonce}"
-    verify_hash = hashlib.sha256(test_string.encode()).hexdigest()
-
-    if not (verify_hash == hash_found and verify_hash.startswith('0' * difficulty)):
+    # Verify the hash itself here; the script checks it against the job's difficulty
+    leading_zeros = verify_group_proof(challenge, payload.nonce, payload.hash_found)
+    if leading_zeros is None:
         raise HTTPException(status_code=400, detail="Invalid proof of work.")
 
-    # --- Atomically check and claim the hash ---
-    # SREM returns 1 if the element was removed, 0 if it wasn't there (i.e., someone else got it first)
-    if redis_client.srem(hashes_to_solve_key, challenge) == 0:
-        # This hash was already solved. Give a small reward for the effort.
-        user_data_str = redis_client.get(f"user:{current_user['username']}")
-        user_data = json.loads(user_data_str)
-        
-        reward_per_hash = float(redis_client.hget(job_key, "reward_per_hash"))
-        consolation_reward = reward_per_hash * 0.10  # 10% reward
+    result = await run_group_proof_script(current_user['username'], job_id, challenge, leading_zeros, get_est_time())
+    outcome = result[0]
 
-        user_data["balance"] += consolation_reward
-        # We don't add this to total_mined as it wasn't a "new" find
-        
-        redis_client.set(f"user:{current_user['username']}", json.dumps(user_data))
-        redis_client.zadd("leaderboard", {current_user['username']: user_data["balance"]})
-
-        add_activity(current_user['username'], "group_mine_dup", consolation_reward, f"Job: {job_id[:8]} (duplicate)")
+    if outcome == "inactive":
+        raise HTTPException(status_code=400, detail="This job is no longer active.")
+    if outcome == "invalid":
+        raise HTTPException(status_code=400, detail="Invalid proof of work.")
 
-        # We must NOT increment hashes_completed here
-        hashes_completed = int(redis_client.hget(job_key, "hashes_completed") or 0)
-        total_hashes = int(redis_client.hget(job_key, "total_hashes"))
+    new_balance = float(result[1])
+    hashes_completed = int(result[2])
+    total_hashes = int(result[3])
 
+    if outcome == "duplicate":
         return {
             "message": "This proof was already submitted, but you've been awarded a small bonus for your effort!",
             "is_duplicate": True,
-            "bonus_awarded": consolation_reward,
-            "new_balance": user_data["balance"],
+            "bonus_awarded": float(result[4]),
+            "new_balance": new_balance,
             "job_id": job_id,
             "hashes_completed": hashes_completed,
             "total_hashes": total_hashes
         }
 
-    # --- Award and Update ---
-    user_data_str = redis_client.get(f"user:{current_user['username']}")
-    user_data = json.loads(user_data_str)
-    
-    reward_per_hash = float(redis_client.hget(job_key, "reward_per_hash"))
-    
-    user_data["balance"] += reward_per_hash
-    user_data["total_mined"] += reward_per_hash
-    
-    # --- Track Contribution ---
-    contribution_key = f"job:{job_id}:contributors"
-    # HINCRBY will increment the user's contribution count for this job by 1
-    redis_client.hincrby(contribution_key, current_user['username'], 1)
-
-    hashes_completed = redis_client.hincrby(job_key, "hashes_completed", 1)
-    
-    # --- Finalize ---
-    pipe = redis_client.pipeline()
-    pipe.set(f"user:{current_user['username']}", json.dumps(user_data))
-    pipe.zadd("leaderboard", {current_user['username']: user_data["balance"]})
-    
-    # Check if this was the final hash
-    total_hashes = int(redis_client.hget(job_key, "total_hashes"))
-    job_was_completed = False
-    if hashes_completed >= total_hashes:
-        job_was_completed = True
-        pipe.hset(job_key, "status", "completed")
-        pipe.srem("group_jobs:active", job_id)
-
-    pipe.execute()
-
-    # Add activity log for the individual hash
-    add_activity(current_user['username'], "group_mine", reward_per_hash, f"Job: {job_id[:8]}...")
-
-    # --- Distribute Bonus if Job was Completed ---
-    if job_was_completed:
-        # Recalculate the bonus based on the new structure
-        base_bonus = 0.01
-        size_multiplier = total_hashes / 16
-        
-        difficulty_multipliers = {
-            5: 1.0,
-            6: 1.15,
-            7: 1.3
-        }
-        difficulty = int(redis_client.hget(job_key, "difficulty") or 5)
-        bonus_multiplier = difficulty_multipliers.get(difficulty, 1.0)
-
-        bonus_amount = (base_bonus * size_multiplier) * bonus_multiplier
-        
-        contributors = redis_client.hgetall(contribution_key)
-        total_contributions = sum(int(c) for c in contributors.values())
-
-        if bonus_amount > 0 and total_contributions > 0:
-            bonus_pipe = redis_client.pipeline()
-            user_specific_bonuses = {} # To hold the bonus for each user
-
-            for username, count_str in contributors.items():
-                contribution_count = int(count_str)
-                percentage = contribution_count / total_contributions
-                user_bonus = bonus_amount * percentage
-                user_specific_bonuses[username] = user_bonus
-                
-                # Fetch user, update balance, and save
-                contrib_user_data_str = redis_client.get(f"user:{username}")
-                if contrib_user_data_str:
-                    contrib_user_data = json.loads(contrib_user_data_str)
-                    contrib_user_data["balance"] += user_bonus
-                    
-                    bonus_pipe.set(f"user:{username}", json.dumps(contrib_user_data))
-                    bonus_pipe.zadd("leaderboard", {username: contrib_user_data["balance"]})
-                    
-                    # Use a separate function call for activity log to ensure correct timestamp
-                    add_activity(username, "group_bonus", user_bonus, f"Job: {job_id[:8]} Completed!")
-            
-            bonus_pipe.execute()
-
     final_response = {
         "message": "Proof accepted! Reward granted.",
-        "new_balance": user_data["balance"],
+        "new_balance": new_balance,
         "job_id": job_id,
         "hashes_completed": hashes_completed,
         "total_hashes": total_hashes
     }
 
-    if job_was_completed:
-        my_bonus = user_specific_bonuses.get(current_user['username'], 0)
-        final_response["bonus_awarded"] = my_bonus
+    if outcome == "completed":
+        final_response["bonus_awarded"] = float(result[5])
         final_response["message"] = "Final proof accepted! Job complete. Bonus distributed."
 
     return final_response
 
+@app.post("/groupjobs/submit/batch", status_code=status.HTTP_200_OK)
+async def submit_group_job_proofs(payload: BatchSubmitProofPayload, current_user: dict = Depends(get_user_by_token)):
+    """
+    Submits many group job proofs at once. All proofs are verified first, then
+    every claim and credit runs in a single MULTI/EXEC of submit scripts.
+    Returns an outcome (accepted / duplicate / invalid) for each proof, in order.
+    """
+    if len(payload.proofs) > MAX_BATCH_PROOFS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {MAX_BATCH_PROOFS} proofs.")
+
+    username = current_user['username']
+    timestamp = get_est_time()
+    results = [None] * len(payload.proofs)
+    queued = []
+    seen = set()
+
+    pipe = redis_client.pipeline()
+    for index, proof in enumerate(payload.proofs):
+        outcome = {"job_id": proof.job_id, "challenge": proof.challenge, "amount": 0.0}
+
+        leading_zeros = verify_group_proof(proof.challenge, proof.nonce, proof.hash_found)
+        if leading_zeros is None:
+            results[index] = dict(outcome, outcome="invalid", detail="Invalid proof of work.")
+            continue
+
+        if (proof.job_id, proof.challenge) in seen:
+            results[index] = dict(outcome, outcome="duplicate", detail="Submitted more than once in this batch.")
+            continue
+        seen.add((proof.job_id, proof.challenge))
+
+        await run_group_proof_script(username, proof.job_id, proof.challenge, leading_zeros, timestamp, client=pipe)
+        queued.append((index, outcome))
+
+    script_results = await pipe.execute() if queued else []
+
+    new_balance = None
+    jobs = {}
+    for (index, outcome), result in zip(queued, script_results):
+        status_name = result[0]
+        if status_name == "inactive":
+            results[index] = dict(outcome, outcome="invalid", detail="This job is no longer active.")
+            continue
+        if status_name == "invalid":
+            results[index] = dict(outcome, outcome="invalid", detail="Invalid proof of work.")
+            continue
+
+        new_balance = float(result[1])
+        job_summary = jobs.setdefault(outcome["job_id"], {"bonus_awarded": 0.0, "completed": False})
+        job_summary["hashes_completed"] = int(result[2])
+        job_summary["total_hashes"] = int(result[3])
+
+        if status_name == "duplicate":
+            results[index] = dict(outcome, outcome="duplicate", amount=float(result[4]))
+        else:
+            results[index] = dict(outcome, outcome="accepted", amount=float(result[4]))
+            if status_name == "completed":
+                job_summary["completed"] = True
+                job_summary["bonus_awarded"] = float(result[5])
+
+    if new_balance is None:
+        new_balance = float(await user_record_command(redis_client.hget, username, "balance") or 0.0)
+
+    counts = {name: sum(1 for r in results if r["outcome"] == name) for name in ("accepted", "duplicate", "invalid")}
+    return {
+        "message": f"Processed {len(results)} proofs: {counts['accepted']} accepted, {counts['duplicate']} duplicate, {counts['invalid']} invalid.",
+        "accepted": counts["accepted"],
+        "duplicates": counts["duplicate"],
+        "invalid": counts["invalid"],
+        "coins_awarded": sum(r["amount"] for r in results) + sum(j["bonus_awarded"] for j in jobs.values()),
+        "new_balance": new_balance,
+        "jobs": jobs,
+        "results": results
+    }
+
 @app.get("/activity", response_model=List[ActivityLog])
 async def get_activity(current_user: dict = Depends(get_user_by_token)):
     """
-    Retrieves the last 10 activity log entries for the current user.
+    Retrieves the last ACTIVITY_LOG_LENGTH activity log entries for the current user, newest first.
     """
     log_key = f"activity:{current_user['username']}"
-    raw_logs = redis_client.lrange(log_key, 0, 9)
+    raw_logs = await redis_client.lrange(log_key, 0, ACTIVITY_LOG_LENGTH - 1)
     
     activity_logs = [json.loads(log) for log in raw_logs]
+    # Entries arrive in write order, which can trail the timestamps by up to ACTIVITY_FLUSH_INTERVAL
+    activity_logs.sort(key=lambda log: datetime.fromisoformat(log["timestamp"]), reverse=True)
     return activity_logs
 
 @app.get("/balance", response_model=UserResponse)
 async def get_balance(current_user: dict = Depends(get_user_by_token)):
     """Get user's current balance"""
-    user_data = redis_client.get(f"user:{current_user['username']}")
-    user_data = json.loads(user_data)
+    user_data = await user_record_command(redis_client.hgetall, current_user['username'])
+    if not user_data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     return UserResponse(
         username=user_data["username"],
@@ -667,98 +2037,219 @@ async def get_balance(current_user: dict = Depends(get_user_by_token)):
         total_mined=user_data["total_mined"]
     )
 
+@app.post("/mine/challenge", response_model=MiningChallenge)
+async def get_mining_challenge(current_user: dict = Depends(get_user_by_token)):
+    """
+    Issues a signed, expiring challenge. The client searches for the nonce
+    locally and submits it to /mine/submit.
+    """
+    return issue_mining_challenge(current_user['username'])
+
+@app.post("/mine/submit", response_model=MiningResult)
+async def submit_mining_proof(payload: MiningSubmitPayload, current_user: dict = Depends(get_user_by_token)):
+    """Verifies a solved online mining challenge and credits the reward."""
+    username = current_user['username']
+    submitted_at = time.time()
+
+    expected_signature = sign_mining_challenge(
+        username, payload.challenge, payload.difficulty, payload.issued_at, payload.expires_at
+    )
+    if not hmac.compare_digest(expected_signature, payload.signature):
+        raise HTTPException(status_code=400, detail="Invalid mining challenge.")
+
+    if submitted_at > payload.expires_at:
+        raise HTTPException(status_code=400, detail="Mining challenge has expired.")
+
+    # Verify the proof of work itself
+    verify_hash = hashlib.sha256(f"{payload.challenge}{payload.nonce}".encode()).hexdigest()
+    if not (verify_hash == payload.hash_found and verify_hash.startswith('0' * payload.difficulty)):
+        raise HTTPException(status_code=400, detail="Invalid proof of work.")
+
+    # Each challenge can only be redeemed once; the claim lives as long as the challenge could
+    claim_ttl = max(1, int(payload.expires_at - submitted_at) + 1)
+    if not await redis_client.set(f"mine_claim:{payload.challenge}", username, nx=True, ex=claim_ttl):
+        raise HTTPException(status_code=409, detail="This challenge was already submitted.")
+
+    coins_earned = calculate_mining_reward(payload.difficulty, submitted_at - payload.issued_at)
+    await credit_online_mining(username, coins_earned, verify_hash)
+
+    return MiningResult(
+        success=True,
+        coins_earned=coins_earned,
+        hash_found=verify_hash,
+        difficulty=payload.difficulty
+    )
+
 @app.post("/mine", response_model=MiningResult)
 async def mine_crypto(current_user: dict = Depends(get_user_by_token)):
-    """Mine cryptocurrency by solving hash puzzles"""
-    # Get user data
-    user_data = redis_client.get(f"user:{current_user['username']}")
-    user_data = json.loads(user_data)
-    
-    # Generate mining challenge
-    challenge = secrets.token_hex(16)
-    target_difficulty = 5  # Increased from 4 to 5
-    
-    # Simulate mining process
-    start_time = time.time()
-    nonce = 0
-    hash_found = None
-    
-    # Try to find a hash with required difficulty
-    while time.time() - start_time < 5:  # Limit mining time to 5 seconds
-        test_string = f"{challenge}{nonce}"
-        test_hash = hashlib.sha256(test_string.encode()).hexdigest()
-        
-        if test_hash.startswith('0' * target_difficulty):
-            hash_found = test_hash
-            break
-        nonce += 1
-    
+    """
+    Legacy mining endpoint kept for older clients. Runs the search for them in
+    a worker process; new clients should use /mine/challenge and /mine/submit.
+    """
+    if legacy_mine_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server mining is busy. Please update your client or try again shortly.",
+            headers={"Retry-After": str(MINE_TIME_LIMIT)}
+        )
+
+    async with legacy_mine_slots:
+        challenge = issue_mining_challenge(current_user['username'])
+        nonce, hash_found = await asyncio.get_running_loop().run_in_executor(
+            get_sync_verify_executor(), search_nonce, challenge.challenge, challenge.difficulty, MINE_TIME_LIMIT
+        )
+
     if hash_found:
-        # Calculate reward based on difficulty and time
-        time_taken = time.time() - start_time
-        base_reward = 0.0005  # Reduced from 0.001
-        difficulty_bonus = target_difficulty * 0.0005
-        time_bonus = max(0, (5 - time_taken) * 0.0001)
-        
-        coins_earned = base_reward + difficulty_bonus + time_bonus
-        
-        # Update user balance
-        user_data["balance"] += coins_earned
-        user_data["total_mined"] += coins_earned
-        
-        # Save updated user data
-        redis_client.set(f"user:{current_user['username']}", json.dumps(user_data))
-        
-        # Update leaderboard
-        redis_client.zadd("leaderboard", {current_user['username']: user_data["balance"]})
-        
-        # Add activity log entry
-        add_activity(current_user['username'], "mine_online", coins_earned, f"Hash: {hash_found[:12]}...")
+        coins_earned = calculate_mining_reward(challenge.difficulty, time.time() - challenge.issued_at)
+        await credit_online_mining(current_user['username'], coins_earned, hash_found)
 
         return MiningResult(
             success=True,
             coins_earned=coins_earned,
             hash_found=hash_found,
-            difficulty=target_difficulty
+            difficulty=challenge.difficulty
         )
     else:
         return MiningResult(
             success=False,
             coins_earned=0.0,
             hash_found="",
-            difficulty=target_difficulty
+            difficulty=challenge.difficulty
         )
 
 @app.get("/leaderboard", response_model=List[LeaderboardEntry])
 async def get_leaderboard():
     """Get the global leaderboard"""
+    return await build_leaderboard()
+
+async def build_leaderboard() -> List[LeaderboardEntry]:
+    """
+    Reads the top 50 of the leaderboard.
+    Costs two Redis round trips: one for the top balances, one for their total_mined scores.
+    """
     # Get top 50 users
-    leaderboard_data = redis_client.zrevrange("leaderboard", 0, 49, withscores=True)
-    
-    leaderboard = []
-    for rank, (username, balance) in enumerate(leaderboard_data, 1):
-        # Get additional user data
-        user_data = redis_client.get(f"user:{username}")
-        if user_data:
-            user_data = json.loads(user_data)
-            leaderboard.append(LeaderboardEntry(
-                username=username,
-                balance=balance,
-                total_mined=user_data.get("total_mined", 0.0),
-                rank=rank
-            ))
-    
-    return leaderboard
+    leaderboard_data = await redis_client.zrevrange("leaderboard", 0, 49, withscores=True)
+    if not leaderboard_data:
+        return []
+
+    usernames = [username for username, _ in leaderboard_data]
+    total_mined_scores = await redis_client.zmscore(TOTAL_MINED_KEY, usernames)
+
+    # Users registered before the total_mined index existed are backfilled once
+    missing = [username for username, score in zip(usernames, total_mined_scores) if score is None]
+    if missing:
+        backfilled = await backfill_total_mined(missing)
+        total_mined_scores = [
+            backfilled.get(username, 0.0) if score is None else score
+            for username, score in zip(usernames, total_mined_scores)
+        ]
+
+    return [
+        LeaderboardEntry(
+            username=username,
+            balance=balance,
+            total_mined=total_mined,
+            rank=rank
+        )
+        for rank, ((username, balance), total_mined) in enumerate(zip(leaderboard_data, total_mined_scores), 1)
+    ]
+
+async def refresh_leaderboard_snapshot() -> bool:
+    """
+    Rereads the leaderboard into the feed's snapshot if its version has moved
+    since the last read; otherwise this costs a single GET. Returns True if
+    the snapshot changed.
+    """
+    global leaderboard_snapshot, leaderboard_version
+    # Read the version first: a change landing during the rebuild leaves it
+    # behind, so the next check rebuilds again rather than missing the change
+    version = await redis_client.get(LEADERBOARD_VERSION_KEY)
+    if leaderboard_snapshot is not None and version == leaderboard_version:
+        return False
+    leaderboard = await build_leaderboard()
+    payload = json.dumps([entry.model_dump() for entry in leaderboard])
+    changed = payload != leaderboard_snapshot
+    leaderboard_snapshot, leaderboard_version = payload, version
+    return changed
+
+async def run_leaderboard_feed():
+    """Background task that pushes leaderboard changes to every subscribed socket."""
+    while True:
+        await asyncio.sleep(LEADERBOARD_FEED_INTERVAL)
+        if not leaderboard_subscribers:
+            continue
+
+        try:
+            if not await refresh_leaderboard_snapshot():
+                continue
+        except Exception as e:
+            print(f"Leaderboard feed refresh failed: {e}")
+            continue
+
+        for queue in list(leaderboard_subscribers):
+            # Replace an update the socket has not sent yet instead of queueing behind it
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(leaderboard_snapshot)
+
+@app.websocket("/ws/leaderboard")
+async def leaderboard_feed(websocket: WebSocket):
+    """Sends the leaderboard on connect and again whenever it changes."""
+    await websocket.accept()
+    queue = asyncio.Queue(maxsize=1)
+
+    # Without other subscribers the producer has been idle, so the snapshot may be old
+    await refresh_leaderboard_snapshot()
+    queue.put_nowait(leaderboard_snapshot)
+    leaderboard_subscribers.add(queue)
+
+    async def send_updates():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(send_updates())
+    try:
+        # The page never sends anything; this returns once it disconnects
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        leaderboard_subscribers.discard(queue)
+        sender.cancel()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request and Redis metrics for this worker in the Prometheus text format"""
+    lines = []
+    for metric in (
+        http_request_duration, http_requests_total, redis_commands_per_request,
+        redis_commands_total, redis_round_trips_total, redis_seconds_total
+    ):
+        lines.extend(metric.render())
+    lines.append("# HELP http_requests_in_flight HTTP requests currently being handled.")
+    lines.append("# TYPE http_requests_in_flight gauge")
+    lines.append(f"http_requests_in_flight {http_requests_in_flight}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        redis_client.ping()
+        await redis_client.ping()
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile-stats":
+        stats = asyncio.run(reconcile_stats())
+        print(f"Stats rebuilt: {stats['total_users']} users, {stats['total_coins_in_circulation']:.6f} coins in circulation")
+    elif len(sys.argv) > 1 and sys.argv[1] == "migrate-users":
+        migrated = asyncio.run(migrate_user_records())
+        print(f"Converted {migrated} JSON user records to hashes")
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
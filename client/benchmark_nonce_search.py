@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the nonce search kernels.
+
+Hashes the same nonce range with the original per-nonce loop, the scalar
+kernel (nonce_search) and, if numpy is installed, the batch kernel
+(numpy_sha256) on one core, checks they all find the same proofs and reports
+hashes/sec for each:
+
+    python client/benchmark_nonce_search.py
+    python client/benchmark_nonce_search.py --nonces 5000000 --rounds 5
+"""
+
+import argparse
+import hashlib
+import os
+import secrets
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy_sha256
+from nonce_search import search_nonce
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the nonce search kernels")
+    parser.add_argument("--nonces", type=int, default=1_000_000, help="nonces hashed per round")
+    parser.add_argument("--rounds", type=int, default=3, help="rounds per loop; the best one counts")
+    parser.add_argument("--difficulty", type=int, default=16, help="leading zeros; high enough that nothing is found")
+    return parser.parse_args()
+
+
+def naive_search(challenge, difficulty, start, count):
+    """The loop the client and server used before the kernel."""
+    target = '0' * difficulty
+    for nonce in range(start, start + count):
+        test_hash = hashlib.sha256(f"{challenge}{nonce}".encode()).hexdigest()
+        if test_hash.startswith(target):
+            return nonce, test_hash, nonce - start + 1
+    return None, None, count
+
+
+def best_rate(search, challenge, difficulty, nonces, rounds):
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        search(challenge, difficulty, 0, nonces)
+        best = max(best, nonces / (time.perf_counter() - start))
+    return best
+
+
+def check_proofs(search, samples=200):
+    """A kernel must return the same proofs as the naive loop, including across nonce groups and batches."""
+    for i in range(samples):
+        challenge = secrets.token_hex(16)
+        start = (i * 997) % 20_000
+        if search(challenge, 2, start, 3000) != naive_search(challenge, 2, start, 3000):
+            return False
+    return True
+
+
+def main():
+    args = parse_args()
+    challenge = secrets.token_hex(16)
+
+    kernels = [("kernel", search_nonce)]
+    if not numpy_sha256.AVAILABLE:
+        print("⚠️  numpy is not installed; skipping the numpy kernel")
+    elif not numpy_sha256.self_check():
+        print("❌ numpy kernel digests do not match hashlib")
+        sys.exit(1)
+    else:
+        kernels.append(("numpy", numpy_sha256.search_nonce))
+
+    print("Checking the kernels find the same proofs as the naive loop...")
+    for name, search in kernels:
+        if not check_proofs(search):
+            print(f"❌ {name} and naive loop disagree")
+            sys.exit(1)
+    print("✅ Proofs match")
+
+    print(f"Hashing {args.nonces:,} nonces, best of {args.rounds} rounds, one core:")
+    naive_rate = best_rate(naive_search, challenge, args.difficulty, args.nonces, args.rounds)
+    print(f"  {'naive loop:':<13}{naive_rate:>12,.0f} hashes/s")
+    for name, search in kernels:
+        rate = best_rate(search, challenge, args.difficulty, args.nonces, args.rounds)
+        print(f"  {name + ':':<13}{rate:>12,.0f} hashes/s  ({rate / naive_rate:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,20 @@ API_BASE_URL = "https://jefe-coin.onrender.com"
 
 # Connection settings
 REQUEST_TIMEOUT = 10  # seconds
-MAX_RETRIES = 3
+MAX_RETRIES = 3  # for failed connections and GETs the server could not answer
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled for each one after
+
+# Group job mining: how often to poll the job for solved challenges. While the
+# job's live event socket is connected, polling is only a slow safety net.
+GROUP_JOB_POLL_INTERVAL = 3  # seconds
+GROUP_JOB_PUSH_POLL_INTERVAL = 30  # seconds
+
+# Mining: worker processes used to search for proofs (0 = one per CPU core)
+# and the nonce search kernel: "hashlib", or "numpy" to hash nonces in
+# batches (needs numpy installed). Once the client's hardware benchmark has
+# run, the setup it picked is used instead.
+MINING_WORKERS = 0
+MINING_KERNEL = "hashlib"
 
 # Display settings
 AUTO_REFRESH_INTERVAL = 30  # seconds for web leaderboard
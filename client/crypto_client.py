@@ -1,4 +1,6 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 import os
@@ -6,20 +8,113 @@ import sys
 from datetime import datetime
 from pathlib import Path
 import secrets
-import hashlib
 import random # Added for random.choice
+import threading
+import multiprocessing
 
-from config import API_BASE_URL, REQUEST_TIMEOUT
+from config import API_BASE_URL, REQUEST_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, GROUP_JOB_POLL_INTERVAL, GROUP_JOB_PUSH_POLL_INTERVAL, MINING_WORKERS, MINING_KERNEL
+from mining_engine import MiningEngine, benchmark_configurations
+
+try:
+    from websockets.sync.client import connect as websocket_connect
+except ImportError:  # Live group job events are optional; without them the miner just polls
+    websocket_connect = None
 
 # Path for local user data storage
 USER_DATA_FILE = Path.home() / ".cryptosim_userdata.json"
 
+class ApiSession(requests.Session):
+    """
+    Keep-alive session shared by every API call, so polls and submits reuse
+    one pooled connection instead of a new TLS handshake each time. Calls get
+    REQUEST_TIMEOUT unless they pass their own. Failed connections, and GETs
+    answered with 502/503/504 (e.g. while the server wakes up), are retried
+    up to MAX_RETRIES times with exponential backoff; other calls are not
+    repeated once sent, since they change state on the server.
+    """
+    def __init__(self):
+        super().__init__()
+        retries = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retries)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+class GroupJobWatcher:
+    """
+    Listens to a group job's event socket on a background thread and records
+    the challenges other miners solve, so the miner can drop a stale challenge
+    within milliseconds instead of waiting for its next poll.
+    """
+    def __init__(self, api_url, job_id, get_token):
+        self.url = api_url.replace("http", "ws", 1) + f"/ws/groupjob/{job_id}"
+        self.get_token = get_token
+        self.solved = set()
+        self.completed = False
+        self.connected = False
+        # Set on every (re)connect: events sent while disconnected must be fetched by polling
+        self.needs_catch_up = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+
+    def start(self):
+        if websocket_connect is not None:
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                headers = {"Authorization": f"Bearer {self.get_token()}"}
+                with websocket_connect(self.url, additional_headers=headers, open_timeout=REQUEST_TIMEOUT) as socket:
+                    self.connected = True
+                    self.needs_catch_up = True
+                    while not self._stop.is_set():
+                        try:
+                            event = json.loads(socket.recv(timeout=0.5))
+                        except TimeoutError:
+                            continue
+                        if event['event'] == 'solved':
+                            self.solved.add(event['challenge'])
+                        elif event['event'] == 'completed':
+                            self.completed = True
+            except Exception:
+                pass
+            self.connected = False
+            # Polling covers for the socket until it reconnects
+            self._stop.wait(5)
+
+
+def format_duration(seconds):
+    """Formats a duration for display, e.g. 45s, 12m, 3.5h, 2.1d."""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
 class CryptoClient:
     def __init__(self, api_url=None):
         self.api_url = api_url or API_BASE_URL
         self.token = None
         self.username = None
+        self.session = ApiSession()
         self.local_data = self.load_local_data()
+        self.mining_engine = self.create_mining_engine()
         
     def load_local_data(self):
         """Load user data from the local JSON file."""
@@ -31,6 +126,13 @@ class CryptoClient:
                 return {}
         return {}
 
+    def create_mining_engine(self):
+        """Mines with the setup the last hardware benchmark picked, or the configured one."""
+        benchmark = self.local_data.get('benchmark')
+        if benchmark:
+            return MiningEngine(benchmark['workers'], benchmark['kernel'])
+        return MiningEngine(MINING_WORKERS, MINING_KERNEL)
+
     def save_local_data(self):
         """Save user data to the local JSON file."""
         try:
@@ -56,7 +158,7 @@ class CryptoClient:
     def check_server_status(self):
         """Check if the server is running"""
         try:
-            response = requests.get(f"{self.api_url}/", timeout=REQUEST_TIMEOUT)
+            response = self.session.get(f"{self.api_url}/", timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 return True
         except requests.exceptions.RequestException:
@@ -85,7 +187,7 @@ class CryptoClient:
             return False
             
         try:
-            response = requests.post(f"{self.api_url}/register", json={
+            response = self.session.post(f"{self.api_url}/register", json={
                 "username": username,
                 "password": password
             })
@@ -116,21 +218,13 @@ class CryptoClient:
         password = input("Enter password: ").strip()
         
         try:
-            response = requests.post(f"{self.api_url}/login", json={
+            response = self.session.post(f"{self.api_url}/login", json={
                 "username": username,
                 "password": password
             })
             
             if response.status_code == 200:
-                data = response.json()
-                self.token = data['token']
-                self.username = data['username']
-                # Save session data for offline use
-                self.local_data['username'] = self.username
-                self.local_data['token'] = self.token
-                if 'offline_proofs' not in self.local_data:
-                    self.local_data['offline_proofs'] = []
-                self.save_local_data()
+                self.store_session(response.json())
                 print(f"\n✅ Login successful! Welcome back, {self.username}!")
                 return True
             else:
@@ -142,6 +236,59 @@ class CryptoClient:
             print(f"❌ Connection error: {e}")
             return False
             
+    def store_session(self, data):
+        """Keeps the tokens from /login or /refresh, and saves them for the next run and offline use."""
+        self.token = data['token']
+        self.username = data['username']
+        self.local_data['username'] = self.username
+        self.local_data['token'] = self.token
+        self.local_data['refresh_token'] = data.get('refresh_token')
+        if 'offline_proofs' not in self.local_data:
+            self.local_data['offline_proofs'] = []
+        self.save_local_data()
+
+    def refresh_session(self):
+        """
+        Trades the saved refresh token for a new access token, so an expired
+        session does not need the password again. Returns True on success.
+        """
+        refresh_token = self.local_data.get('refresh_token')
+        if not refresh_token:
+            return False
+
+        try:
+            response = self.session.post(f"{self.api_url}/refresh", json={"refresh_token": refresh_token}, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException:
+            return False
+
+        if response.status_code == 200:
+            self.store_session(response.json())
+            return True
+
+        if response.status_code == 401:
+            # The session has ended (logout, newer login or expiry); a password login is needed
+            self.local_data['refresh_token'] = None
+            self.save_local_data()
+        return False
+
+    def authorized_request(self, method, path, **kwargs):
+        """
+        Sends an authenticated request. If the access token has expired it is
+        refreshed and the request sent once more; if that is not possible the
+        session is cleared so the menu asks for a password login.
+        """
+        url = f"{self.api_url}{path}"
+        response = self.session.request(method, url, headers={"Authorization": f"Bearer {self.token}"}, **kwargs)
+        if response.status_code != 401:
+            return response
+
+        if self.refresh_session():
+            return self.session.request(method, url, headers={"Authorization": f"Bearer {self.token}"}, **kwargs)
+
+        print("❌ Your session has expired. Please log in again.")
+        self.token = None
+        return response
+
     def sync_offline_mining(self):
         """Sync offline mined coins with the server."""
         if not self.local_data.get('offline_proofs'):
@@ -157,16 +304,31 @@ class CryptoClient:
             print("❌ Server is still offline. Cannot sync right now.")
             return
 
+        def post_proofs():
+            headers = {
+                "Authorization": f"Bearer {self.local_data.get('token')}",
+                "Content-Type": "application/x-ndjson"
+            }
+            # Stream the proofs one per line so neither side holds one huge JSON document
+            proof_lines = ((json.dumps(proof) + "\n").encode() for proof in self.local_data['offline_proofs'])
+            return self.session.post(f"{self.api_url}/sync", headers=headers, data=proof_lines, timeout=REQUEST_TIMEOUT)
+
         try:
-            headers = {"Authorization": f"Bearer {self.local_data.get('token')}"}
-            payload = {"proofs": self.local_data['offline_proofs']}
-            
-            response = requests.post(f"{self.api_url}/sync", headers=headers, json=payload)
+            response = post_proofs()
+            # The saved token is often stale after a spell offline; renew it and retry once
+            if response.status_code == 401 and self.refresh_session():
+                response = post_proofs()
 
             if response.status_code == 200:
                 data = response.json()
                 print(f"✅ Sync successful!")
+                chunks = data.get('chunks', [])
+                if len(chunks) > 1:
+                    for chunk in chunks:
+                        print(f"   Chunk {chunk['chunk']}: {chunk['valid']}/{chunk['proofs']} valid, +{chunk['coins_synced']:.6f} $JEFE")
                 print(f"💰 $JEFE awarded: {data['total_coins_synced']:.6f}")
+                if data.get('duplicates'):
+                    print(f"⚠️ {data['duplicates']} proofs were already synced and earned nothing.")
                 print(f"💳 Your new balance is: {data['new_balance']:.6f}")
                 # Clear local proofs after successful sync
                 self.local_data['offline_proofs'] = []
@@ -174,6 +336,7 @@ class CryptoClient:
             elif response.status_code == 401:
                 print("❌ Your session has expired. Please log in again to sync.")
                 # Clear the expired token
+                self.token = None
                 self.local_data['token'] = None
                 self.save_local_data()
             else:
@@ -190,8 +353,7 @@ class CryptoClient:
             return
             
         try:
-            headers = {"Authorization": f"Bearer {self.token}"}
-            response = requests.get(f"{self.api_url}/balance", headers=headers)
+            response = self.authorized_request("GET", "/balance", timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 data = response.json()
@@ -214,15 +376,15 @@ class CryptoClient:
         if self.token:
             try:
                 headers = {"Authorization": f"Bearer {self.token}"}
-                requests.post(f"{self.api_url}/logout", headers=headers, timeout=REQUEST_TIMEOUT)
+                self.session.post(f"{self.api_url}/logout", headers=headers, timeout=REQUEST_TIMEOUT)
             except requests.exceptions.RequestException:
                 print("⚠️  Could not contact server to log out, but clearing local session.")
 
         # Clear local session regardless of server status
         self.token = None
         self.username = None
-        if 'token' in self.local_data:
-            self.local_data['token'] = None
+        self.local_data['token'] = None
+        self.local_data['refresh_token'] = None
         self.save_local_data()
         print("✅ Logged out successfully!")
         time.sleep(2)
@@ -257,12 +419,11 @@ class CryptoClient:
 
         print("🚀 Sending transaction...")
         try:
-            headers = {"Authorization": f"Bearer {self.token}"}
             payload = {
                 "recipient_wallet_address": recipient_address,
                 "amount": amount
             }
-            response = requests.post(f"{self.api_url}/transfer", headers=headers, json=payload)
+            response = self.authorized_request("POST", "/transfer", json=payload, timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 data = response.json()
@@ -289,20 +450,34 @@ class CryptoClient:
         print("⏱️  This may take a few seconds...")
         
         try:
-            headers = {"Authorization": f"Bearer {self.token}"}
-            response = requests.post(f"{self.api_url}/mine", headers=headers)
+            # Ask the server for a signed challenge, then solve it locally
+            response = self.authorized_request("POST", "/mine/challenge", timeout=REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                print("❌ Mining request failed!")
+                return
+
+            challenge = response.json()
+            # Leave a little time at the end of the window to submit the proof
+            deadline = challenge['expires_at'] - REQUEST_TIMEOUT
+            result = self.mining_engine.search(challenge['challenge'], challenge['difficulty'], deadline=deadline)
+
+            if not result:
+                print("\n❌ Mining failed - no valid hash found in time limit")
+                return
+
+            nonce, hash_found = result
+            payload = dict(challenge, nonce=nonce, hash_found=hash_found)
+            response = self.authorized_request("POST", "/mine/submit", json=payload, timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 data = response.json()
-                if data['success']:
-                    print(f"\n✅ Mining successful!")
-                    print(f"💰 $JEFE earned: {data['coins_earned']:.6f}")
-                    print(f"🔢 Hash found: {data['hash_found'][:16]}...")
-                    print(f"🎯 Difficulty: {data['difficulty']} leading zeros")
-                else:
-                    print("\n❌ Mining failed - no valid hash found in time limit")
+                print(f"\n✅ Mining successful!")
+                print(f"💰 $JEFE earned: {data['coins_earned']:.6f}")
+                print(f"🔢 Hash found: {data['hash_found'][:16]}...")
+                print(f"🎯 Difficulty: {data['difficulty']} leading zeros")
             else:
-                print("❌ Mining request failed!")
+                error_data = response.json()
+                print(f"❌ Proof rejected by server: {error_data.get('detail', 'Unknown error')}")
                 
         except requests.exceptions.RequestException as e:
             print(f"❌ Connection error: {e}")
@@ -322,21 +497,12 @@ class CryptoClient:
         # Simulate mining process locally
         challenge = secrets.token_hex(16)
         target_difficulty = 5  # Increased from 4 to 5, must match server
-        start_time = time.time()
-        nonce = 0
-        hash_found = None
 
         # This can be a bit more intensive as it runs on user's machine
-        while time.time() - start_time < 8:
-            test_string = f"{challenge}{nonce}"
-            test_hash = hashlib.sha256(test_string.encode()).hexdigest()
-            
-            if test_hash.startswith('0' * target_difficulty):
-                hash_found = test_hash
-                break
-            nonce += 1
+        result = self.mining_engine.search(challenge, target_difficulty, deadline=time.time() + 8)
         
-        if hash_found:
+        if result:
+            nonce, hash_found = result
             proof = {
                 "challenge": challenge,
                 "nonce": nonce,
@@ -355,18 +521,58 @@ class CryptoClient:
         else:
             print("\n❌ Mining failed - no valid hash found in time limit.")
 
+    def run_benchmark(self):
+        """Measures mining speed for each kernel and worker count and switches to the fastest."""
+        print("\n" + "="*60)
+        print("🧪 MINING HARDWARE BENCHMARK")
+        print("="*60)
+        print(f"🖥️  {os.cpu_count() or 1} CPU core(s) detected. This takes a little while...\n")
+
+        self.mining_engine.close()
+        try:
+            results = benchmark_configurations()
+        except KeyboardInterrupt:
+            print("\n🛑 Benchmark stopped by user.")
+            self.mining_engine = self.create_mining_engine()
+            return
+
+        best = results[0]
+        self.local_data['benchmark'] = {
+            "kernel": best['kernel'],
+            "workers": best['workers'],
+            "hashes_per_second": best['hashes_per_second'],
+            "per_core": best['per_core'],
+            "cpu_count": os.cpu_count() or 1,
+            "measured_at": datetime.now().isoformat(timespec='seconds'),
+        }
+        self.save_local_data()
+        self.mining_engine = self.create_mining_engine()
+
+        print("\n" + "-"*60)
+        print(f"🏆 Fastest: {best['kernel']} with {best['workers']} worker(s), {best['hashes_per_second']:,.0f} hashes/s")
+        print("✅ Mining will use this setup from now on.")
+        print("="*60)
+
+    def estimate_solve_time(self, difficulty):
+        """Expected seconds to solve one challenge at this difficulty, or None without a benchmark."""
+        benchmark = self.local_data.get('benchmark')
+        if not benchmark or not benchmark.get('hashes_per_second'):
+            return None
+        # Each hex digit is zero with probability 1/16
+        return 16 ** difficulty / benchmark['hashes_per_second']
+
     def show_leaderboard(self):
         """Show the global leaderboard and total coin supply."""
         try:
             # First, get the overall stats
-            stats_response = requests.get(f"{self.api_url}/stats", timeout=REQUEST_TIMEOUT)
+            stats_response = self.session.get(f"{self.api_url}/stats", timeout=REQUEST_TIMEOUT)
             total_coins_str = "N/A"
             if stats_response.status_code == 200:
                 stats_data = stats_response.json()
                 total_coins_str = f"{stats_data.get('total_coins_in_circulation', 0):.6f} $JEFE"
 
             # Then, get the leaderboard data
-            leaderboard_response = requests.get(f"{self.api_url}/leaderboard", timeout=REQUEST_TIMEOUT)
+            leaderboard_response = self.session.get(f"{self.api_url}/leaderboard", timeout=REQUEST_TIMEOUT)
             
             if leaderboard_response.status_code == 200:
                 leaderboard = leaderboard_response.json()
@@ -396,8 +602,7 @@ class CryptoClient:
         print("="*70)
 
         try:
-            headers = {"Authorization": f"Bearer {self.token}"}
-            response = requests.get(f"{self.api_url}/activity", headers=headers, timeout=REQUEST_TIMEOUT)
+            response = self.authorized_request("GET", "/activity", timeout=REQUEST_TIMEOUT)
 
             if response.status_code == 200:
                 activities = response.json()
@@ -432,23 +637,29 @@ class CryptoClient:
         print("="*70)
 
         try:
-            headers = {"Authorization": f"Bearer {self.token}"}
-            response = requests.get(f"{self.api_url}/groupjobs", headers=headers, timeout=REQUEST_TIMEOUT)
+            response = self.authorized_request("GET", "/groupjobs", timeout=REQUEST_TIMEOUT)
 
             if response.status_code == 200:
                 jobs = response.json()
                 if not jobs:
                     print("No active group jobs available. Check back later!")
                 else:
-                    print(f"{'ID':<18} {'Progress':<18} {'Reward/Hash':<18} {'Difficulty':<15} {'Status'}")
-                    print("-" * 80)
+                    print(f"{'ID':<18} {'Progress':<18} {'Reward/Hash':<18} {'Difficulty':<15} {'Dup Rate':<10} {'Est. Solve':<12} {'Status'}")
+                    print("-" * 103)
                     difficulty_map = {5: "Easy", 6: "Intermediate", 7: "Hard"}
                     for job in jobs:
                         progress = f"{job['hashes_completed']} / {job['total_hashes']}"
                         reward = f"{job['reward_per_hash']:.6f} $JEFE"
                         difficulty = difficulty_map.get(job['difficulty'], "Unknown")
-                        print(f"{job['job_id']:<18} {progress:<18} {reward:<18} {difficulty:<15} {job['status']}")
-                    print("="*80)
+                        duplicate_rate = f"{job.get('duplicate_rate', 0.0):.0%}"
+                        solve_time = self.estimate_solve_time(job['difficulty'])
+                        estimate = format_duration(solve_time) if solve_time is not None else "-"
+                        print(f"{job['job_id']:<18} {progress:<18} {reward:<18} {difficulty:<15} {duplicate_rate:<10} {estimate:<12} {job['status']}")
+                    print("="*103)
+                    if self.local_data.get('benchmark'):
+                        print("⏱️  Est. Solve is the expected time for your machine to solve one hash of the job.")
+                    else:
+                        print("⏱️  Run the hardware benchmark from the main menu to see solve time estimates.")
                     
                     # Prompt user to work on a job
                     job_choice_id = input("Enter the ID of the job you want to work on (or press Enter to cancel): ").strip()
@@ -473,43 +684,98 @@ class CryptoClient:
         print("Press Ctrl+C to stop mining.")
         print("="*70)
 
+        watcher = GroupJobWatcher(self.api_url, job['job_id'], lambda: self.token)
+        watcher.start()
+        try:
+            self.work_on_group_job(job, watcher)
+        finally:
+            watcher.stop()
+
+    def work_on_group_job(self, job, watcher):
+        """Mines the job's challenges until it is complete, dropping any that the watcher reports solved."""
         unsolved_challenges = job.get('challenges', [])
+        job_version = job.get('version', 0)
         last_refresh_time = time.time()
+        next_lease = None
         
         while unsolved_challenges:
             try:
-                # Pick a random, valid challenge from the list provided by the server
-                challenge = random.choice(unsolved_challenges)
+                unsolved_challenges = [c for c in unsolved_challenges if c not in watcher.solved]
+                if not unsolved_challenges:
+                    break
+                # Lease a challenge few others are working on; pick a random one if leasing fails
+                lease = next_lease or self.lease_group_challenge(job['job_id'])
+                next_lease = None
+                challenge = lease['challenge'] if lease else random.choice(unsolved_challenges)
                 target_difficulty = job['difficulty']
                 print(f"\nNow working on challenge: {challenge[:12]}... [{len(unsolved_challenges)} remaining]")
+                if lease and lease['shared_with']:
+                    print(f"👥 Every challenge is taken; sharing this one with {lease['shared_with']} other miner(s).")
 
-                nonce = 0
-                hash_found = None
-                
-                # Persistent mining loop for a single challenge
-                while True:
-                    # Refresh job status every 3 seconds
-                    if time.time() - last_refresh_time > 3:
+                stop_reason = None
+
+                def should_stop():
+                    """Called by the mining engine while it hashes; True abandons this challenge."""
+                    nonlocal lease, next_lease, unsolved_challenges, job_version, last_refresh_time, stop_reason
+
+                    # Solves pushed over the job's socket are picked up within a moment
+                    if watcher.completed:
+                        print("🎉 This job has been completed by the team! Stopping mining.")
+                        stop_reason = 'finished'
+                        return True
+                    if challenge in watcher.solved:
+                        print("🟡 Someone else solved this challenge. Switching to a new one.")
+                        return True
+
+                    # Renew the lease before it runs out so the challenge is not handed to someone else
+                    if lease and time.time() > lease['renew_at']:
+                        renewed = self.lease_group_challenge(job['job_id'], renew=True)
+                        if renewed is None:
+                            lease['renew_at'] = time.time() + GROUP_JOB_POLL_INTERVAL
+                        elif renewed['challenge'] != challenge:
+                            # Ours was solved in the meantime and the server leased us another
+                            next_lease = renewed
+                            print("🟡 Someone else solved this challenge. Switching to a new one.")
+                            return True
+                        else:
+                            lease = renewed
+
+                    # Refresh job status every few seconds, or rarely while events are pushed to us
+                    poll_interval = GROUP_JOB_PUSH_POLL_INTERVAL if watcher.connected else GROUP_JOB_POLL_INTERVAL
+                    if watcher.needs_catch_up or time.time() - last_refresh_time > poll_interval:
+                        watcher.needs_catch_up = False
                         print("\n🔄 Refreshing job status...")
                         try:
-                            headers = {"Authorization": f"Bearer {self.token}"}
-                            response = requests.get(f"{self.api_url}/groupjob/{job['job_id']}", headers=headers, timeout=REQUEST_TIMEOUT)
+                            # Only fetch the challenges solved since the last version we saw
+                            response = self.authorized_request(
+                                "GET",
+                                f"/groupjob/{job['job_id']}/changes",
+                                params={"since": job_version},
+                                timeout=REQUEST_TIMEOUT
+                            )
                             
                             if response.status_code == 200:
-                                updated_job = response.json()
-                                unsolved_challenges = updated_job.get('challenges', [])
+                                changes = response.json()
+                                job_version = changes['version']
+                                if changes.get('resync'):
+                                    unsolved_challenges = changes.get('challenges', [])
+                                else:
+                                    solved = set(changes.get('solved', []))
+                                    unsolved_challenges = [c for c in unsolved_challenges if c not in solved]
                                 
-                                if updated_job.get('status') == 'completed':
+                                if changes.get('status') == 'completed':
                                     print("🎉 This job has been completed by the team! Stopping mining.")
-                                    return # Exit function entirely
+                                    stop_reason = 'finished'
+                                    return True
                                 
                                 if not unsolved_challenges:
                                     print("🏁 All challenges for this job are solved. Stopping mining.")
-                                    return # Exit function entirely
+                                    stop_reason = 'finished'
+                                    return True
 
                                 if challenge not in unsolved_challenges:
                                     print("🟡 Someone else solved this challenge. Switching to a new one.")
-                                    break # Exit inner loop to pick a new challenge
+                                    return True
                                 
                                 print(f"✅ Job status updated. {len(unsolved_challenges)} challenges remaining.")
                             else:
@@ -519,71 +785,60 @@ class CryptoClient:
                             print(f"❌ Connection error during refresh: {e}")
                         
                         last_refresh_time = time.time()
+                    return False
 
-                    # Perform mining work
-                    test_string = f"{challenge}{nonce}"
-                    test_hash = hashlib.sha256(test_string.encode()).hexdigest()
-                    if test_hash.startswith('0' * target_difficulty):
-                        hash_found = test_hash
-                        break # Found a hash, exit inner loop to submit
-                    
-                    nonce += 1
-                    # Small sleep to prevent pegging the CPU
-                    if nonce % 100000 == 0:
-                        time.sleep(0.01)
+                # Search the challenge on every mining worker until it is solved or abandoned
+                result = self.mining_engine.search(challenge, target_difficulty, should_stop=should_stop)
+                if stop_reason == 'finished':
+                    return # Exit function entirely
 
-                # If the inner loop was broken due to a refresh, hash_found will be None
-                if not hash_found:
+                # If the search was abandoned, pick a new challenge
+                if not result:
                     continue # Go to the next iteration of the outer while loop to get a new challenge
+                nonce, hash_found = result
 
                 # --- Submit the found proof ---
                 print(f"\nFound a potential proof! Submitting to server...")
-                headers = {"Authorization": f"Bearer {self.token}"}
-                payload = {
+                proof = {
                     "job_id": job['job_id'],
                     "challenge": challenge,
                     "nonce": nonce,
                     "hash_found": hash_found
                 }
-                response = requests.post(f"{self.api_url}/groupjobs/submit", headers=headers, json=payload)
+                data = self.submit_group_proofs([proof])
 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data.get("is_duplicate"):
-                        print(f"🟡 That hash was already solved, but you earned a small bonus of {data['bonus_awarded']:.6f} $JEFE.")
-                        print(f"Your new balance is {data['new_balance']:.6f}.")
-                    else:
-                        print(f"✅ SUCCESS! Your proof was accepted.")
-                        print(f"💰 You earned {job['reward_per_hash']:.6f} $JEFE. Your new balance is {data['new_balance']:.6f}.")
-                        print(f"Job progress: {data['hashes_completed']} / {data['total_hashes']}")
-                    
-                    # Remove the solved challenge and continue to the next one
-                    if challenge in unsolved_challenges:
-                        unsolved_challenges.remove(challenge)
-                    
-                    # --- Check for Job Completion (only for non-duplicates) ---
-                    if not data.get("is_duplicate") and "bonus_awarded" in data:
-                        print("\n" + "="*70)
-                        print("🎉 JOB COMPLETE! 🎉")
-                        print(f"As a contributor, you have been awarded a bonus of {data['bonus_awarded']:.6f} $JEFE!")
-                        print("="*70)
-                        return # Exit the function
-
-                    if not unsolved_challenges:
-                        print("\n🏁 All available challenges for this job have been solved from your end!")
-                        return # Exit the function
-                
-                elif response.status_code == 409: # Conflict - hash already solved
-                    print("🟡 Someone else solved that hash just before you. Trying a different one...")
-                    if challenge in unsolved_challenges:
-                        unsolved_challenges.remove(challenge)
-                
+                # Whatever the outcome, this challenge is done; continue with the next one
+                if challenge in unsolved_challenges:
+                    unsolved_challenges.remove(challenge)
+
+                if data is None:
+                    print("Trying a different challenge.")
+                    continue
+
+                result = data['results'][0]
+                job_summary = data['jobs'].get(job['job_id'], {})
+
+                if result['outcome'] == 'duplicate':
+                    print(f"🟡 That hash was already solved, but you earned a small bonus of {result['amount']:.6f} $JEFE.")
+                    print(f"Your new balance is {data['new_balance']:.6f}.")
+                elif result['outcome'] == 'accepted':
+                    print(f"✅ SUCCESS! Your proof was accepted.")
+                    print(f"💰 You earned {result['amount']:.6f} $JEFE. Your new balance is {data['new_balance']:.6f}.")
+                    print(f"Job progress: {job_summary['hashes_completed']} / {job_summary['total_hashes']}")
                 else:
-                    error_data = response.json()
-                    print(f"❌ Proof rejected by server: {error_data.get('detail', 'Unknown error')}. Trying a different challenge.")
-                    if challenge in unsolved_challenges:
-                        unsolved_challenges.remove(challenge)
+                    print(f"❌ Proof rejected by server: {result.get('detail', 'Unknown error')}. Trying a different challenge.")
+
+                # --- Check for Job Completion ---
+                if job_summary.get('completed'):
+                    print("\n" + "="*70)
+                    print("🎉 JOB COMPLETE! 🎉")
+                    print(f"As a contributor, you have been awarded a bonus of {job_summary['bonus_awarded']:.6f} $JEFE!")
+                    print("="*70)
+                    return # Exit the function
+
+                if not unsolved_challenges:
+                    print("\n🏁 All available challenges for this job have been solved from your end!")
+                    return # Exit the function
 
             except KeyboardInterrupt:
                 print("\n🛑 Mining stopped by user.")
@@ -597,9 +852,53 @@ class CryptoClient:
         
         print("\n🏁 Group job mining session finished.")
 
+    def lease_group_challenge(self, job_id, renew=False):
+        """
+        Asks the server for a challenge of the job that few or no other miners
+        are working on. Returns the lease, or None if the server could not give one.
+        """
+        try:
+            response = self.authorized_request(
+                "POST",
+                f"/groupjob/{job_id}/lease",
+                params={"renew": "true"} if renew else None,
+                timeout=REQUEST_TIMEOUT
+            )
+        except requests.exceptions.RequestException:
+            return None
+
+        if response.status_code != 200:
+            return None
+        lease = response.json()
+        # Time the renewal on the local clock; only the lease length comes from the server
+        lease['renew_at'] = time.time() + lease['lease_seconds'] * 0.8
+        return lease
+
+    def submit_group_proofs(self, proofs):
+        """
+        Submits one or more group job proofs in a single request.
+        Returns the server's response with a per-proof outcome, or None if the request was rejected.
+        """
+        response = self.authorized_request(
+            "POST",
+            "/groupjobs/submit/batch",
+            json={"proofs": proofs},
+            timeout=REQUEST_TIMEOUT
+        )
+
+        if response.status_code == 200:
+            return response.json()
+
+        error_data = response.json()
+        print(f"❌ Proofs rejected by server: {error_data.get('detail', 'Unknown error')}")
+        return None
+
     def main_menu(self):
         """Display the main menu based on server status and login state."""
         is_server_up = self.check_server_status()
+        # Pick up the saved session from the last run without asking for the password
+        if is_server_up and self.refresh_session():
+            print(f"✅ Welcome back, {self.username}!")
 
         while True:
             self.clear_screen()
@@ -624,10 +923,11 @@ class CryptoClient:
                     print("4. 🤝 Group Jobs")
                     print("5. 📜 Recent Activity")
                     print("6. 🏆 View Leaderboard")
-                    print("7. 🚪 Logout")
-                    print("8. ❌ Exit")
+                    print("7. 🧪 Benchmark Mining Hardware")
+                    print("8. 🚪 Logout")
+                    print("9. ❌ Exit")
                     
-                    choice = input("\nSelect an option (1-8): ").strip()
+                    choice = input("\nSelect an option (1-9): ").strip()
                     
                     if choice == "1":
                         self.get_balance()
@@ -642,8 +942,10 @@ class CryptoClient:
                     elif choice == "6":
                         self.show_leaderboard()
                     elif choice == "7":
-                        self.logout_user()
+                        self.run_benchmark()
                     elif choice == "8":
+                        self.logout_user()
+                    elif choice == "9":
                         print("👋 Thanks for using JEFE COIN!")
                         break
                     else:
@@ -678,13 +980,16 @@ class CryptoClient:
 
                     print("\n📋 Available Actions:")
                     print("1. ⛏️  Mine Offline")
-                    print("2. 🔄 Attempt to Reconnect")
-                    print("3. ❌ Exit")
+                    print("2. 🧪 Benchmark Mining Hardware")
+                    print("3. 🔄 Attempt to Reconnect")
+                    print("4. ❌ Exit")
 
-                    choice = input("\nSelect an option (1-3): ").strip()
+                    choice = input("\nSelect an option (1-4): ").strip()
                     if choice == "1":
                         self.mine_offline()
                     elif choice == "2":
+                        self.run_benchmark()
+                    elif choice == "3":
                         is_server_up = self.check_server_status()
                         if is_server_up:
                             print("✅ Server is back online!")
@@ -693,7 +998,7 @@ class CryptoClient:
                             print("❌ Server is still offline.")
                         time.sleep(2)
                         continue # Re-render menu
-                    elif choice == "3":
+                    elif choice == "4":
                         print("👋 Thanks for using JEFE COIN!")
                         break
                     else:
@@ -719,7 +1024,17 @@ class CryptoClient:
 def main():
     """Main function"""
     client = CryptoClient()
-    client.main_menu()
+    try:
+        # "crypto_client.py benchmark" measures the hardware without opening the menu
+        if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+            client.run_benchmark()
+        else:
+            client.main_menu()
+    finally:
+        client.mining_engine.close()
+        client.session.close()
 
 if __name__ == "__main__":
+    # Mining workers are separate processes, which the frozen .exe must support
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,177 @@
+"""
+Multi-core nonce search for the JEFE COIN client.
+
+The nonce space of a challenge is cut into blocks that are handed out to a
+pool of worker processes. As soon as one worker finds a proof, or the caller
+reports the challenge is stale, every worker is told to stop and the search
+returns.
+"""
+
+import functools
+import multiprocessing
+import os
+import secrets
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import nonce_search
+import numpy_sha256
+
+# Nonce search kernels a MiningEngine can run: "hashlib" is the scalar kernel,
+# "numpy" hashes batches of nonces as arrays and needs numpy installed
+KERNELS = {
+    "hashlib": nonce_search.search_nonce,
+    "numpy": numpy_sha256.search_nonce,
+}
+
+# Nonces per task. Workers check the stop flag every nonce_search.GROUP_SIZE
+# nonces, so a stop takes effect within a few milliseconds either way.
+NONCE_BLOCK_SIZE = 65536
+
+# How often the caller's should_stop() is consulted while workers hash
+STOP_POLL_INTERVAL = 0.1  # seconds
+
+# Benchmarks search at a difficulty no hash can meet, so every nonce is tried
+BENCHMARK_DIFFICULTY = 64
+BENCHMARK_WARMUP = 0.5  # seconds; covers starting the worker processes
+
+_stop_event = None
+
+
+def _init_worker(stop_event):
+    global _stop_event
+    _stop_event = stop_event
+    # Ctrl+C is handled by the client, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+@functools.lru_cache(maxsize=None)
+def available_kernels():
+    """Kernel names usable on this machine; numpy must be installed and agree with hashlib."""
+    kernels = ("hashlib",)
+    if numpy_sha256.AVAILABLE and numpy_sha256.self_check():
+        kernels += ("numpy",)
+    return kernels
+
+
+def search_block(kernel, challenge, difficulty, start, count):
+    """
+    Tries nonces start .. start + count - 1 for the challenge with the named kernel. Returns
+    (nonce, hash_found, hashes_tried); nonce and hash_found are None if no
+    proof was found or the search was stopped.
+    """
+    should_stop = _stop_event.is_set if _stop_event is not None else None
+    return KERNELS[kernel](challenge, difficulty, start, count, should_stop)
+
+
+class MiningEngine:
+    """Searches for proofs on a pool of worker processes, started on first use."""
+
+    def __init__(self, workers=0, kernel="hashlib"):
+        self.workers = workers or os.cpu_count() or 1
+        if kernel not in KERNELS or (kernel != "hashlib" and kernel not in available_kernels()):
+            print(f"⚠️  Mining kernel '{kernel}' is not available here; using hashlib.")
+            kernel = "hashlib"
+        self.kernel = kernel
+        self.last_hash_rate = 0.0  # hashes/sec of the last search
+        self._pool = None
+        self._stop_event = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._stop_event = context.Event()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._stop_event,)
+            )
+        return self._pool
+
+    def search(self, challenge, difficulty, deadline=None, should_stop=None):
+        """
+        Searches the challenge's nonce space on all workers until a proof is
+        found, `deadline` (a time.time() value) passes or should_stop() returns
+        True. Returns (nonce, hash_found), or None if nothing was found.
+        """
+        pool = self._get_pool()
+        self._stop_event.clear()
+        next_nonce = 0
+        hashes = 0
+        found = None
+        start_time = time.time()
+
+        def submit_block():
+            nonlocal next_nonce
+            future = pool.submit(search_block, self.kernel, challenge, difficulty, next_nonce, NONCE_BLOCK_SIZE)
+            next_nonce += NONCE_BLOCK_SIZE
+            return future
+
+        # Two blocks per worker so none sits idle while its next block is queued
+        pending = {submit_block() for _ in range(self.workers * 2)}
+        try:
+            while found is None:
+                done, pending = wait(pending, timeout=STOP_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    nonce, hash_found, tried = future.result()
+                    hashes += tried
+                    if nonce is not None and found is None:
+                        found = (nonce, hash_found)
+                if found is not None:
+                    break
+                if (deadline is not None and time.time() >= deadline) or (should_stop and should_stop()):
+                    break
+                pending |= {submit_block() for _ in done}
+        finally:
+            # Stop every worker, including those still queued, before the next search
+            self._stop_event.set()
+            for future in pending:
+                future.cancel()
+            for future in wait(pending).done:
+                if not future.cancelled():
+                    hashes += future.result()[2]
+            elapsed = time.time() - start_time
+            self.last_hash_rate = hashes / elapsed if elapsed > 0 else 0.0
+
+        return found
+
+    def close(self):
+        """Shuts down the worker processes."""
+        if self._pool is not None:
+            self._stop_event.set()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def benchmark_configurations(seconds=3.0):
+    """
+    Measures every available kernel at 1, 2, 4, ... workers up to one per CPU
+    core. Returns a list of {"kernel", "workers", "hashes_per_second",
+    "per_core"} dicts, fastest first.
+    """
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    challenge = secrets.token_hex(16)
+    results = []
+
+    for kernel in available_kernels():
+        for workers in worker_counts:
+            engine = MiningEngine(workers, kernel)
+            try:
+                engine.search(challenge, BENCHMARK_DIFFICULTY, deadline=time.time() + BENCHMARK_WARMUP)
+                engine.search(challenge, BENCHMARK_DIFFICULTY, deadline=time.time() + seconds)
+            finally:
+                engine.close()
+            rate = engine.last_hash_rate
+            print(f"  {kernel:<8} x {workers:>2} worker(s): {rate:>12,.0f} hashes/s ({rate / workers:,.0f} per core)")
+            results.append({
+                "kernel": kernel,
+                "workers": workers,
+                "hashes_per_second": rate,
+                "per_core": rate / workers,
+            })
+
+    results.sort(key=lambda result: result["hashes_per_second"], reverse=True)
+    return results
@@ -0,0 +1,71 @@
+"""
+Single-core nonce search kernel.
+
+A proof is a nonce whose sha256(f"{challenge}{nonce}") hex digest starts with
+`difficulty` zeros. Instead of building and hashing that whole string for
+every nonce, the kernel:
+
+- absorbs the challenge once and copies that hash state for each nonce,
+- walks the nonces in groups of 1000 that share their leading digits, so the
+  leading digits are absorbed once per group and only a precomputed 3-digit
+  suffix is hashed per nonce,
+- compares the raw digest against a precomputed bound instead of formatting
+  it as hex, which is only done for the proof itself,
+- consults should_stop() once per group rather than on every nonce.
+
+The proofs are exactly those the naive loop finds.
+"""
+
+import hashlib
+
+GROUP_SIZE = 1000
+
+# Nonce suffixes: below 1000 the nonce has no leading digits, above it the
+# last three digits keep their zeros (1000 -> "1" + "000")
+PLAIN_SUFFIXES = [str(low).encode() for low in range(GROUP_SIZE)]
+PADDED_SUFFIXES = [f"{low:03d}".encode() for low in range(GROUP_SIZE)]
+
+
+def digest_bound(difficulty):
+    """The largest digest that still has `difficulty` leading zero nibbles."""
+    return bytes.fromhex('0' * difficulty + 'f' * (64 - difficulty))
+
+
+def search_nonce(challenge, difficulty, start=0, count=None, should_stop=None):
+    """
+    Tries nonces from `start` (`count` of them, or until stopped) for the
+    challenge. should_stop() is called every GROUP_SIZE nonces. Returns
+    (nonce, hash_found, hashes_tried); nonce and hash_found are None if no
+    proof was found.
+    """
+    bound = digest_bound(difficulty)
+    challenge_state = hashlib.sha256(challenge.encode())
+    end = start + count if count is not None else None
+    nonce = start
+    tried = 0
+
+    while end is None or nonce < end:
+        if should_stop is not None and should_stop():
+            break
+
+        group, low = divmod(nonce, GROUP_SIZE)
+        high = GROUP_SIZE if end is None else min(GROUP_SIZE, end - group * GROUP_SIZE)
+        if group:
+            group_state = challenge_state.copy()
+            group_state.update(str(group).encode())
+            suffixes = PADDED_SUFFIXES
+        else:
+            group_state = challenge_state
+            suffixes = PLAIN_SUFFIXES
+
+        for offset, suffix in enumerate(suffixes[low:high]):
+            state = group_state.copy()
+            state.update(suffix)
+            if state.digest() <= bound:
+                found = nonce + offset
+                return found, state.hexdigest(), tried + offset + 1
+
+        tried += high - low
+        nonce = group * GROUP_SIZE + high
+
+    return None, None, tried
@@ -0,0 +1,165 @@
+"""
+Optional NumPy nonce search kernel.
+
+Hashes a batch of consecutive nonces at once: every lane of a uint32 array is
+one candidate message f"{challenge}{nonce}", laid out and padded exactly as
+hashlib would hash it, and the SHA-256 rounds run on whole arrays. Message
+words that hold no nonce digits are the same in every lane and are kept as
+1-element arrays, so the rounds before the first digit cost next to nothing.
+
+search_nonce() has the same signature and results as nonce_search.search_nonce,
+so the mining engine can use either. Hits are re-hashed with hashlib before
+they are returned. Requires numpy; AVAILABLE is False without it.
+"""
+
+import hashlib
+
+try:
+    import numpy as np
+    AVAILABLE = True
+except ImportError:
+    np = None
+    AVAILABLE = False
+
+BATCH_SIZE = 32768
+
+K = [
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]
+
+INITIAL_STATE = [0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]
+
+
+def _rotr(x, n):
+    return (x >> n) | (x << (32 - n))
+
+
+def _compress(state, words):
+    """One SHA-256 block over uint32 lane arrays; 1-element arrays broadcast."""
+    w = list(words)
+    for t in range(16, 64):
+        s0 = _rotr(w[t - 15], 7) ^ _rotr(w[t - 15], 18) ^ (w[t - 15] >> 3)
+        s1 = _rotr(w[t - 2], 17) ^ _rotr(w[t - 2], 19) ^ (w[t - 2] >> 10)
+        w.append(w[t - 16] + s0 + w[t - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state
+    for t in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        choice = (e & f) ^ (~e & g)
+        temp1 = h + s1 + choice + K[t] + w[t]
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        majority = (a & b) ^ (a & c) ^ (b & c)
+        h, g, f, e, d, c, b, a = g, f, e, d + temp1, c, b, a, temp1 + s0 + majority
+
+    return [x + y for x, y in zip(state, (a, b, c, d, e, f, g, h))]
+
+
+def digest_words(challenge, nonces):
+    """
+    SHA-256 of f"{challenge}{nonce}" for an array of consecutive nonces that
+    all have the same number of digits. Returns the 8 digest words as uint32 arrays.
+    """
+    prefix = challenge.encode()
+    first, last = str(int(nonces[0])), str(int(nonces[-1]))
+    digits = len(first)
+    length = len(prefix) + digits
+    blocks = (length + 8) // 64 + 1
+
+    # Message bytes: an int for bytes shared by every lane, an array for the
+    # low digits that change within the batch
+    message = list(prefix) + list(first.encode()) + [0x80] + [0] * (blocks * 64 - length - 9)
+    message += list((length * 8).to_bytes(8, 'big'))
+    shared = next((i for i in range(digits) if first[i] != last[i]), digits)
+    for i in range(shared, digits):
+        place = np.uint64(10 ** (digits - 1 - i))
+        message[len(prefix) + i] = ((nonces // place) % np.uint64(10) + np.uint64(48)).astype(np.uint32)
+
+    state = [np.array([value], dtype=np.uint32) for value in INITIAL_STATE]
+    for block in range(blocks):
+        words = []
+        for j in range(16):
+            chunk = message[block * 64 + j * 4:block * 64 + j * 4 + 4]
+            if all(isinstance(byte, int) for byte in chunk):
+                words.append(np.array([int.from_bytes(bytes(chunk), 'big')], dtype=np.uint32))
+            else:
+                word = np.zeros(1, dtype=np.uint32)
+                for shift, byte in zip((24, 16, 8, 0), chunk):
+                    word = word | (byte << shift if isinstance(byte, int) else byte << np.uint32(shift))
+                words.append(word)
+        state = _compress(state, words)
+    return state
+
+
+def _leading_zero_mask(words, difficulty):
+    """True for lanes whose digest starts with `difficulty` zero hex digits."""
+    mask = np.ones(words[0].shape, dtype=bool)
+    remaining = difficulty
+    for word in words:
+        if remaining <= 0:
+            break
+        nibbles = min(remaining, 8)
+        mask &= (word >> np.uint32(32 - 4 * nibbles)) == 0 if nibbles < 8 else word == 0
+        remaining -= nibbles
+    return mask
+
+
+def search_nonce(challenge, difficulty, start=0, count=None, should_stop=None):
+    """
+    Tries nonces from `start` (`count` of them, or until stopped) in batches
+    of BATCH_SIZE. should_stop() is called once per batch. Returns
+    (nonce, hash_found, hashes_tried); nonce and hash_found are None if no
+    proof was found.
+    """
+    end = start + count if count is not None else None
+    nonce = start
+    tried = 0
+
+    while end is None or nonce < end:
+        if should_stop is not None and should_stop():
+            break
+
+        # A batch never spans a change in digit count, e.g. 999 -> 1000
+        batch_end = nonce + BATCH_SIZE
+        batch_end = min(batch_end, 10 ** len(str(nonce)))
+        if end is not None:
+            batch_end = min(batch_end, end)
+        nonces = np.arange(nonce, batch_end, dtype=np.uint64)
+
+        words = digest_words(challenge, nonces)
+        hits = np.flatnonzero(_leading_zero_mask(words, difficulty))
+        if hits.size:
+            found = nonce + int(hits[0])
+            return found, hashlib.sha256(f"{challenge}{found}".encode()).hexdigest(), tried + int(hits[0]) + 1
+
+        tried += batch_end - nonce
+        nonce = batch_end
+
+    return None, None, tried
+
+
+def self_check():
+    """
+    Compares full digests with hashlib for assorted challenge lengths and
+    nonce sizes, including multi-block messages. Returns True if all match.
+    """
+    if not AVAILABLE:
+        return False
+    challenges = ["", "abc", "7f970dea574fc3dafcdaeaf55a2acd03", "x" * 55, "y" * 64, "z" * 119]
+    starts = [0, 7, 995, 123456, 10 ** 12 - 3]
+    for challenge in challenges:
+        for start in starts:
+            nonces = np.arange(start, start + 3, dtype=np.uint64)
+            nonces = nonces[[len(str(int(n))) == len(str(start)) for n in nonces]]
+            words = digest_words(challenge, nonces)
+            for lane, nonce in enumerate(nonces):
+                digest = b''.join(int(word[lane if word.size > 1 else 0]).to_bytes(4, 'big') for word in words)
+                if digest != hashlib.sha256(f"{challenge}{int(nonce)}".encode()).digest():
+                    return False
+    return True
@@ -22,10 +22,10 @@ echo Python 3.11 found!
 
 REM Check if required packages are installed
 echo Checking dependencies...
-py -3.11 -c "import requests" >nul 2>&1
+py -3.11 -c "import requests, websockets" >nul 2>&1
 if errorlevel 1 (
     echo Installing required packages...
-    py -3.11 -m pip install requests
+    py -3.11 -m pip install requests websockets
     if errorlevel 1 (
         echo ERROR: Failed to install required packages
         pause
@@ -28,9 +28,9 @@ if not exist ".env" (
     echo UPSTASH_REDIS_REST_URL=your-redis-url
     echo UPSTASH_REDIS_REST_PORT=your-redis-port
     echo UPSTASH_REDIS_REST_PASSWORD=your-redis-password
-    echo SECRET_KEY=your-secret-key-here
+    echo SECRET_KEY=^<run: python -c "import secrets; print(secrets.token_hex(32))"^>
     echo.
-    echo The server will use default values if .env is not found.
+    echo The server will not start without a SECRET_KEY.
     echo.
 )
 
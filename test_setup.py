@@ -1,12 +1,26 @@
 #!/usr/bin/env python3
 """
-Test script to verify CryptoSim setup
+Test script to verify CryptoSim setup, and a load generator for the API.
+
+    python test_setup.py [api_url]                      # one pass of setup checks
+    python test_setup.py --load --users 50 [api_url]    # simulate concurrent users
+    python test_setup.py --load --local --users 50      # ...against a local server on an in-process Redis
 """
 
 import requests
+import argparse
+import asyncio
+import hashlib
 import json
+import multiprocessing
+import os
+import random
+import secrets
+import subprocess
 import time
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 def test_server_connection(api_url="http://localhost:8000"):
     """Test if the server is running and accessible"""
@@ -144,13 +158,307 @@ def test_leaderboard(api_url="http://localhost:8000"):
         print(f"❌ Leaderboard error: {e}")
         return False
 
-def main():
+def solve_challenge(challenge, difficulty):
+    """Finds a nonce whose hash has `difficulty` leading zeros"""
+    target = "0" * difficulty
+    nonce = 0
+    while True:
+        hash_found = hashlib.sha256(f"{challenge}{nonce}".encode()).hexdigest()
+        if hash_found.startswith(target):
+            return nonce, hash_found
+        nonce += 1
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class LoadStats:
+    """Latency samples and status codes per endpoint for a load run"""
+    def __init__(self):
+        self.latencies = defaultdict(list)  # "METHOD /route" -> seconds
+        self.client_errors = defaultdict(int)  # 4xx
+        self.server_errors = defaultdict(int)  # 5xx and failed connections
+        self.skipped = defaultdict(int)  # steps skipped because the difficulty was too high
+
+    def record(self, endpoint, seconds, status_code):
+        self.latencies[endpoint].append(seconds)
+        if status_code is None or status_code >= 500:
+            self.server_errors[endpoint] += 1
+        elif status_code >= 400:
+            self.client_errors[endpoint] += 1
+
+    def report(self, elapsed):
+        print("\n" + "=" * 86)
+        print("📊 Load Test Results")
+        print("=" * 86)
+        print(f"{'Endpoint':<34}{'Requests':>9}{'4xx':>6}{'5xx/err':>8}{'Req/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}")
+        total = 0
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            total += len(samples)
+            print(f"{endpoint:<34}{len(samples):>9}{self.client_errors[endpoint]:>6}{self.server_errors[endpoint]:>8}"
+                  f"{len(samples) / elapsed:>8.1f}{percentile(samples, 50) * 1000:>8.1f}"
+                  f"{percentile(samples, 95) * 1000:>8.1f}{percentile(samples, 99) * 1000:>8.1f}")
+        print("-" * 86)
+        all_samples = sorted(sample for samples in self.latencies.values() for sample in samples)
+        print(f"{'Total':<34}{total:>9}{sum(self.client_errors.values()):>6}{sum(self.server_errors.values()):>8}"
+              f"{total / elapsed:>8.1f}{percentile(all_samples, 50) * 1000:>8.1f}"
+              f"{percentile(all_samples, 95) * 1000:>8.1f}{percentile(all_samples, 99) * 1000:>8.1f}")
+        for step, count in self.skipped.items():
+            print(f"⚠️  Skipped {count} {step} steps above --max-difficulty")
+
+class SimulatedUser:
+    """
+    One user going through a realistic session: register, login, then mine,
+    work on group jobs, check the leaderboard and balance and send coins until
+    the run ends. Each user runs its requests one after another on its own
+    connection, like the real client.
+    """
+    def __init__(self, api_url, username, stats, max_difficulty, think_time, solver_pool):
+        self.api_url = api_url
+        self.username = username
+        self.password = "loadtest123"
+        self.stats = stats
+        self.max_difficulty = max_difficulty
+        self.think_time = think_time
+        self.solver_pool = solver_pool
+        self.session = requests.Session()
+        self.wallet_address = None
+        self.token = None
+        self.refresh_token = None
+
+    async def request(self, method, route, path=None, authorized=True, **kwargs):
+        """
+        Sends one request and records it under `route`, the path template. 503s
+        are retried after Retry-After and expired access tokens are refreshed.
+        """
+        url = f"{self.api_url}{path or route}"
+        for attempt in range(3):
+            headers = {"Authorization": f"Bearer {self.token}"} if authorized and self.token else {}
+            start = time.perf_counter()
+            try:
+                response = await asyncio.to_thread(self.session.request, method, url, headers=headers, timeout=30, **kwargs)
+            except requests.exceptions.RequestException:
+                self.stats.record(f"{method} {route}", time.perf_counter() - start, None)
+                return None
+            self.stats.record(f"{method} {route}", time.perf_counter() - start, response.status_code)
+
+            if response.status_code == 503 and attempt < 2:
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            elif response.status_code == 401 and authorized and self.refresh_token and attempt < 2:
+                if not await self.refresh():
+                    return response
+            else:
+                return response
+        return response
+
+    async def refresh(self):
+        response = await self.request("POST", "/refresh", authorized=False, json={"refresh_token": self.refresh_token})
+        if response is None or response.status_code != 200:
+            self.refresh_token = None
+            return False
+        data = response.json()
+        self.token, self.refresh_token = data["token"], data["refresh_token"]
+        return True
+
+    async def sign_up(self):
+        response = await self.request("POST", "/register", authorized=False,
+                                      json={"username": self.username, "password": self.password})
+        if response is None or response.status_code != 200:
+            return False
+        self.wallet_address = response.json()["wallet_address"]
+
+        response = await self.request("POST", "/login", authorized=False,
+                                      json={"username": self.username, "password": self.password})
+        if response is None or response.status_code != 200:
+            return False
+        data = response.json()
+        self.token, self.refresh_token = data["token"], data.get("refresh_token")
+        return True
+
+    async def solve(self, challenge, difficulty):
+        """Solves on the solver processes so hashing does not hold the GIL while requests are timed"""
+        return await asyncio.get_running_loop().run_in_executor(self.solver_pool, solve_challenge, challenge, difficulty)
+
+    async def mine(self):
+        response = await self.request("POST", "/mine/challenge")
+        if response is None or response.status_code != 200:
+            return
+        challenge = response.json()
+        if challenge["difficulty"] > self.max_difficulty:
+            self.stats.skipped["mining"] += 1
+            return
+        nonce, hash_found = await self.solve(challenge["challenge"], challenge["difficulty"])
+        await self.request("POST", "/mine/submit", json={**challenge, "nonce": nonce, "hash_found": hash_found})
+
+    async def work_on_group_job(self):
+        response = await self.request("GET", "/groupjobs")
+        if response is None or response.status_code != 200:
+            return
+        jobs = [job for job in response.json() if job["difficulty"] <= self.max_difficulty]
+        if not jobs:
+            self.stats.skipped["group job"] += 1
+            return
+        job = random.choice(jobs)
+        route = "/groupjob/{job_id}/lease"
+        response = await self.request("POST", route, path=route.format(job_id=job["job_id"]))
+        if response is None or response.status_code != 200:
+            return
+        challenge = response.json()["challenge"]
+        nonce, hash_found = await self.solve(challenge, job["difficulty"])
+        await self.request("POST", "/groupjobs/submit", json={
+            "job_id": job["job_id"], "challenge": challenge, "nonce": nonce, "hash_found": hash_found
+        })
+
+    async def send_coins(self, peers):
+        recipients = [peer for peer in peers if peer is not self and peer.wallet_address]
+        response = await self.request("GET", "/balance")
+        if not recipients or response is None or response.status_code != 200:
+            return
+        amount = round(response.json()["balance"] * 0.01, 6)
+        if amount > 0:
+            await self.request("POST", "/transfer", json={
+                "recipient_wallet_address": random.choice(recipients).wallet_address, "amount": amount
+            })
+
+    async def run(self, deadline, peers):
+        if not await self.sign_up():
+            return
+        while time.monotonic() < deadline:
+            await self.mine()
+            await self.work_on_group_job()
+            await self.request("GET", "/leaderboard", authorized=False)
+            await self.send_coins(peers)
+            await asyncio.sleep(random.uniform(0, self.think_time))
+
+async def run_load(api_url, users, duration, ramp_up, max_difficulty, think_time, solvers):
+    """Runs `users` simulated users against the API for `duration` seconds"""
+    # Each user blocks a thread while a request is in flight; proofs are solved
+    # on `solvers` processes so the hashing never delays the timed requests
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=users))
+    solver_pool = ProcessPoolExecutor(max_workers=solvers, mp_context=multiprocessing.get_context("spawn"))
+
+    stats = LoadStats()
+    run_id = f"{int(time.time())}{random.randint(0, 999):03d}"
+    simulated = [
+        SimulatedUser(api_url, f"load_{run_id}_{i}", stats, max_difficulty, think_time, solver_pool)
+        for i in range(users)
+    ]
+
+    async def start_user(user, delay, deadline):
+        await asyncio.sleep(delay)
+        await user.run(deadline, simulated)
+
+    print(f"🚀 Simulating {users} users against {api_url} for {duration}s (ramp-up {ramp_up}s)...")
+    start = time.monotonic()
+    deadline = start + ramp_up + duration
+    try:
+        await asyncio.gather(*[
+            start_user(user, ramp_up * i / users, deadline) for i, user in enumerate(simulated)
+        ])
+    finally:
+        solver_pool.shutdown(cancel_futures=True)
+    stats.report(time.monotonic() - start)
+
+def serve_local(port, difficulty):
+    """
+    Runs the backend on an in-process Redis stand-in (fakeredis). Mining and
+    group job difficulty are lowered to `difficulty` so the load generator
+    spends its time on requests rather than hashing.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        print("❌ --local needs fakeredis with Lua support: pip install 'fakeredis[lua]'")
+        sys.exit(1)
+    import uvicorn
+    import redis.asyncio as redis
+
+    # The backend will not start without a SECRET_KEY; a throwaway one is
+    # enough for a server that lives as long as the test
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+    import main as backend
+
+    # Swap the pool under the existing client so the Lua scripts and the
+    # metrics wrapper keep working
+    backend.redis_client.connection_pool = redis.ConnectionPool(
+        connection_class=fakeredis.aioredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True
+    )
+    backend.MINE_DIFFICULTY = difficulty
+    manage_group_jobs = backend.manage_group_jobs
+
+    async def manage_group_jobs_at_local_difficulty():
+        await manage_group_jobs()
+        for job_id in await backend.redis_client.smembers("group_jobs:active"):
+            await backend.redis_client.hset(f"job:{job_id}", "difficulty", difficulty)
+
+    backend.manage_group_jobs = manage_group_jobs_at_local_difficulty
+    uvicorn.run(backend.app, host="127.0.0.1", port=port, log_level="warning")
+
+def start_local_server(port, difficulty):
+    """Starts serve_local() in a child process and waits until it answers"""
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve-local",
+        "--port", str(port), "--difficulty", str(difficulty)
+    ])
+    api_url = f"http://127.0.0.1:{port}"
+    for _ in range(60):
+        if server.poll() is not None:
+            sys.exit(1)
+        try:
+            if requests.get(f"{api_url}/", timeout=1).status_code == 200:
+                # Give the scheduler a moment to create the first group jobs
+                time.sleep(1)
+                return server, api_url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    print("❌ Local server did not start")
+    sys.exit(1)
+
+def load_test(args):
+    """Runs the load generator, against a local server if --local is given"""
+    server = None
+    api_url = args.api_url
+    if args.local:
+        server, api_url = start_local_server(args.port, args.difficulty)
+    try:
+        asyncio.run(run_load(
+            api_url, args.users, args.duration, args.ramp_up, args.max_difficulty, args.think_time, args.solvers
+        ))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Verify a CryptoSim setup or put it under load")
+    parser.add_argument("api_url", nargs="?", default="http://localhost:8000")
+    parser.add_argument("--load", action="store_true", help="run the concurrent load generator")
+    parser.add_argument("--users", type=int, default=20, help="simulated users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=1, help="max seconds a user pauses between rounds")
+    parser.add_argument("--max-difficulty", type=int, default=5, help="skip mining work harder than this")
+    parser.add_argument("--solvers", type=int, default=os.cpu_count() or 1, help="processes solving proofs")
+    parser.add_argument("--local", action="store_true", help="start a local server on an in-process Redis")
+    parser.add_argument("--port", type=int, default=8123, help="port for --local")
+    parser.add_argument("--difficulty", type=int, default=3, help="mining difficulty for --local")
+    parser.add_argument("--serve-local", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main(api_url="http://localhost:8000"):
     """Run all tests"""
     print("🧪 CryptoSim Setup Test")
     print("=" * 50)
-    
-    # Get API URL from command line or use default
-    api_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
     print(f"Testing API at: {api_url}")
     
     # Run tests
@@ -198,5 +506,9 @@ def main():
     return tests_passed == total_tests
 
 if __name__ == "__main__":
-    success = main()
+    args = parse_args()
+    if args.serve_local:
+        serve_local(args.port, args.difficulty)
+        sys.exit(0)
+    success = load_test(args) if args.load else main(args.api_url)
     sys.exit(0 if success else 1)